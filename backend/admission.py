@@ -0,0 +1,135 @@
+import os
+import re
+import asyncio
+import logging
+
+from starlette.responses import JSONResponse
+
+import metrics
+from log_config import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# LLM-bound requests (each holds a worker thread for a full model call)
+LLM_MAX_CONCURRENCY = int(os.getenv("ADMISSION_LLM_CONCURRENCY", "8"))
+LLM_MAX_QUEUE = int(os.getenv("ADMISSION_LLM_QUEUE", "16"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_LLM_QUEUE_TIMEOUT", "10")) # Seconds a request may wait for a slot
+# Storage-only requests (reads, renames, deletes)
+STORAGE_MAX_CONCURRENCY = int(os.getenv("ADMISSION_STORAGE_CONCURRENCY", "32"))
+STORAGE_MAX_QUEUE = int(os.getenv("ADMISSION_STORAGE_QUEUE", "64"))
+STORAGE_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_STORAGE_QUEUE_TIMEOUT", "5"))
+# Bulk exports (each streams for minutes, so they get their own small pool instead of holding storage slots)
+EXPORT_MAX_CONCURRENCY = int(os.getenv("ADMISSION_EXPORT_CONCURRENCY", "2"))
+EXPORT_MAX_QUEUE = int(os.getenv("ADMISSION_EXPORT_QUEUE", "4"))
+EXPORT_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_EXPORT_QUEUE_TIMEOUT", "5"))
+RETRY_AFTER_SECONDS = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", "5"))
+
+# Requests that start a model call; everything else under /api only touches storage.
+_LLM_ROUTES = [
+    ("POST", re.compile(r"^/api/chats/?$")),
+    ("POST", re.compile(r"^/api/chats/[^/]+/messages/?$")),
+]
+_EXPORT_ROUTES = [
+    ("GET", re.compile(r"^/api/exports/?$")),
+]
+# Probes and metrics must keep answering even when every pool is saturated.
+_UNMANAGED_PATHS = {"/healthz", "/readyz", "/api/metrics"}
+
+
+class AdmissionPool:
+    """
+    Caps concurrent requests of one class, with a bounded wait queue and a queueing deadline.
+    Requests beyond the queue depth, or still waiting at the deadline, are shed instead of
+    piling up. Runs on the event loop, so shedding costs no worker thread.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int, queue_timeout: float):
+        self.name = name
+        self.max_concurrency = max(max_concurrency, 1)
+        self.max_queue = max(max_queue, 0)
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.queued = 0
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    def _update_gauges(self):
+        metrics.set_gauge(f"admission.{self.name}.in_flight", self.in_flight)
+        metrics.set_gauge(f"admission.{self.name}.queued", self.queued)
+
+    async def acquire(self) -> str | None:
+        """Waits for a slot. Returns None once admitted, or the reason the request was shed."""
+        if self._semaphore.locked():
+            if self.queued >= self.max_queue:
+                metrics.increment(f"admission.{self.name}.shed_queue_full")
+                return "queue_full"
+            self.queued += 1
+            self._update_gauges()
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                metrics.increment(f"admission.{self.name}.shed_deadline")
+                return "deadline"
+            finally:
+                self.queued -= 1
+                self._update_gauges()
+        else:
+            await self._semaphore.acquire()
+        self.in_flight += 1
+        self._update_gauges()
+        metrics.increment(f"admission.{self.name}.admitted")
+        return None
+
+    def release(self):
+        self.in_flight -= 1
+        self._semaphore.release()
+        self._update_gauges()
+
+
+LLM_POOL = AdmissionPool("llm", LLM_MAX_CONCURRENCY, LLM_MAX_QUEUE, LLM_QUEUE_TIMEOUT)
+STORAGE_POOL = AdmissionPool("storage", STORAGE_MAX_CONCURRENCY, STORAGE_MAX_QUEUE, STORAGE_QUEUE_TIMEOUT)
+EXPORT_POOL = AdmissionPool("export", EXPORT_MAX_CONCURRENCY, EXPORT_MAX_QUEUE, EXPORT_QUEUE_TIMEOUT)
+
+
+def classify_request(method: str, path: str) -> AdmissionPool | None:
+    """Picks the pool for a request, or None for requests that bypass admission control."""
+    if method == "OPTIONS" or path in _UNMANAGED_PATHS or not path.startswith("/api/"):
+        return None
+    for route_method, pattern in _LLM_ROUTES:
+        if method == route_method and pattern.match(path):
+            return LLM_POOL
+    for route_method, pattern in _EXPORT_ROUTES:
+        if method == route_method and pattern.match(path):
+            return EXPORT_POOL
+    return STORAGE_POOL
+
+
+class AdmissionMiddleware:
+    """ASGI middleware that routes each request through its admission pool and sheds overload with 503 + Retry-After."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        pool = classify_request(scope["method"], scope["path"])
+        if pool is None:
+            await self.app(scope, receive, send)
+            return
+
+        rejection = await pool.acquire()
+        if rejection:
+            logger.warning("Shedding %s %s from %s pool (%s)", scope["method"], scope["path"], pool.name, rejection)
+            response = JSONResponse(
+                status_code=503,
+                content={"detail": "Server is busy, please retry shortly."},
+                headers={"Retry-After": str(RETRY_AFTER_SECONDS)},
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            pool.release()
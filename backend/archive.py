@@ -0,0 +1,143 @@
+import os
+import json
+import mmap
+import zlib
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import metrics
+from log_config import setup_logging
+
+try:
+    import fcntl # Cross-process append lock; unavailable on Windows, where only the in-process lock applies
+except ImportError:
+    fcntl = None
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Required when tiering is enabled. Archived sessions exist only here, so this must be shared, persistent
+# storage mounted at the same path on every host and worker (e.g. an Azure Files share), never a container's local disk.
+ARCHIVE_DIR = os.getenv("PRD_ARCHIVE_DIR")
+ARCHIVE_SEGMENT_MAX_BYTES = int(os.getenv("PRD_ARCHIVE_SEGMENT_MAX_BYTES", str(64 * 1024 * 1024))) # Roll to a new segment past this size
+ARCHIVE_CACHE_SIZE = int(os.getenv("PRD_ARCHIVE_CACHE_SIZE", "128")) # Rehydrated sessions kept in memory
+
+SEGMENT_SUFFIX = ".seg"
+INDEX_SUFFIX = ".idx"
+
+_write_lock = threading.Lock()
+_job_lock = threading.Lock()
+_maps = {} # Segment name -> (file object, mmap) for reading
+_maps_lock = threading.Lock()
+_cache: "OrderedDict[tuple, dict]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+class ArchiveUnavailableError(RuntimeError):
+    """An archived chat session exists but its record could not be read (missing mount, I/O error, corrupt record)."""
+
+
+def _archive_dir() -> str:
+    if not ARCHIVE_DIR:
+        raise RuntimeError("PRD_ARCHIVE_DIR is not set; archived chat sessions cannot be located.")
+    return ARCHIVE_DIR
+
+
+def _segment_path(segment: str) -> str:
+    return os.path.join(_archive_dir(), segment + SEGMENT_SUFFIX)
+
+
+def _active_segment() -> str:
+    """Returns the segment to append to, starting a new one when the newest is full."""
+    segments = sorted(name[:-len(SEGMENT_SUFFIX)] for name in os.listdir(ARCHIVE_DIR) if name.endswith(SEGMENT_SUFFIX))
+    if segments and os.path.getsize(_segment_path(segments[-1])) < ARCHIVE_SEGMENT_MAX_BYTES:
+        return segments[-1]
+    next_number = int(segments[-1].split("-")[-1]) + 1 if segments else 1
+    return f"segment-{next_number:06d}"
+
+
+def append_session(chat_id: str, record: dict) -> tuple[str, int, int]:
+    """
+    Appends one compressed session record to the active segment and its offset index.
+    Segments are append-only; a record is never rewritten in place.
+
+    Returns:
+        (segment name, byte offset, byte length) locating the record.
+    """
+    data = zlib.compress(json.dumps(record, default=str, ensure_ascii=False).encode("utf-8"))
+    os.makedirs(_archive_dir(), exist_ok=True)
+    with _write_lock, open(os.path.join(ARCHIVE_DIR, "append.lock"), "w") as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        segment = _active_segment()
+        with open(_segment_path(segment), "ab") as segment_file:
+            offset = segment_file.seek(0, os.SEEK_END)
+            segment_file.write(data)
+            segment_file.flush()
+            os.fsync(segment_file.fileno())
+        # The index lets segments be scanned or rebuilt without the table's stub rows.
+        with open(os.path.join(ARCHIVE_DIR, segment + INDEX_SUFFIX), "a", encoding="utf-8") as index_file:
+            index_file.write(f"{chat_id}\t{offset}\t{len(data)}\n")
+    return segment, offset, len(data)
+
+
+def _read_segment(segment: str, offset: int, length: int) -> bytes:
+    """
+    Copies a byte range out of a segment's read-only mmap, remapping the active segment if it has
+    grown past the mapping. The copy is taken under the lock, so a remap never closes a mapping
+    that is still being read.
+    """
+    with _maps_lock:
+        mapped = _maps.get(segment)
+        if not mapped or len(mapped[1]) < offset + length:
+            if mapped:
+                mapped[1].close()
+                mapped[0].close()
+            segment_file = open(_segment_path(segment), "rb")
+            mapped = (segment_file, mmap.mmap(segment_file.fileno(), 0, access=mmap.ACCESS_READ))
+            _maps[segment] = mapped
+        return mapped[1][offset:offset + length]
+
+
+def read_session(segment: str, offset: int, length: int) -> dict:
+    """Reads and decompresses one archived session record, serving repeat reads from an LRU cache."""
+    key = (segment, offset)
+    with _cache_lock:
+        record = _cache.get(key)
+        if record is not None:
+            _cache.move_to_end(key)
+            metrics.increment("archive.cache_hits")
+            return record
+
+    record = json.loads(zlib.decompress(_read_segment(segment, offset, length)))
+    metrics.increment("archive.rehydrations")
+    with _cache_lock:
+        _cache[key] = record
+        while len(_cache) > ARCHIVE_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return record
+
+
+@contextmanager
+def tiering_job_lock():
+    """
+    Yields True if this process may run the tiering job now, False if another worker
+    (or thread) already is, so multiple workers sharing ARCHIVE_DIR do not archive the same sessions twice.
+    """
+    if not _job_lock.acquire(blocking=False):
+        yield False
+        return
+    try:
+        os.makedirs(_archive_dir(), exist_ok=True)
+        with open(os.path.join(ARCHIVE_DIR, "tiering.lock"), "w") as lock_file:
+            if fcntl:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    yield False
+                    return
+            yield True
+    finally:
+        _job_lock.release()
@@ -0,0 +1,189 @@
+import os
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from prd import get_prd_update, SYSTEM_PROMPT_PRD, INITIAL_ASSISTANT_MESSAGE_CONVO
+import storage
+from log_config import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+BATCH_CONCURRENCY = int(os.getenv("PRD_BATCH_CONCURRENCY", "8")) # Max briefs in flight across all batches
+BATCH_REQUESTS_PER_MINUTE = int(os.getenv("PRD_BATCH_REQUESTS_PER_MINUTE", "60")) # Model calls per minute for batch work, 0 disables
+BATCH_MAX_ATTEMPTS = int(os.getenv("PRD_BATCH_MAX_ATTEMPTS", "2")) # Attempts per brief before marking it failed
+BATCH_MAX_ITEMS = 500
+
+ITEM_QUEUED = "queued"
+ITEM_RUNNING = "running"
+ITEM_SUCCEEDED = "succeeded"
+ITEM_FAILED = "failed"
+
+
+class _RateLimiter:
+    """Token bucket shared by all batch workers so bulk runs stay under the deployment's rate limit."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = max(per_minute, 0)
+        self.tokens = float(self.capacity)
+        self.rate = self.capacity / 60.0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if not self.capacity:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+_executor = ThreadPoolExecutor(max_workers=max(BATCH_CONCURRENCY, 1), thread_name_prefix="prd-batch")
+_rate_limiter = _RateLimiter(BATCH_REQUESTS_PER_MINUTE)
+
+
+def _set_item(batch_id: str, index: int, status: str, error: str | None = None):
+    finished_at = time.time() if status in (ITEM_SUCCEEDED, ITEM_FAILED) else None
+    if not storage.update_batch_item(batch_id, index, status, error=error, finished_at=finished_at):
+        logger.error("Could not record status '%s' for batch %s item %s", status, batch_id, index)
+
+
+def _call_with_retries(label: str, step: str, api_input: list, previous_response_id: str | None) -> tuple:
+    """Calls get_prd_update under the shared rate limit, retrying up to BATCH_MAX_ATTEMPTS times."""
+    result = (None, None, None, None)
+    for attempt in range(1, max(BATCH_MAX_ATTEMPTS, 1) + 1):
+        _rate_limiter.acquire()
+        result = get_prd_update(input_data=api_input, previous_response_id=previous_response_id)
+        conversational_part, _, response_id, error = result
+        if not error and conversational_part is not None and response_id:
+            return result
+        logger.warning("Batch %s step for %s failed on attempt %s: %s", step, label, attempt, error)
+    return result
+
+
+def _generate_first_draft(chat_id: str, name: str, brief: str, initial_response_id: str) -> str | None:
+    """
+    Runs the first turn of the interactive flow for one brief, chained to the batch's shared
+    create-chat response, and stores the result. Returns an error message, or None on success.
+    A draft whose first turn returns no PRD counts as a failure, so no blank template is stored.
+    """
+    conversational_part, prd_markdown_part, response_id, error = _call_with_retries(
+        f"chat {chat_id}", "first turn", [{"type": "message", "role": "user", "content": brief}], initial_response_id
+    )
+    if error or conversational_part is None or not response_id:
+        return error or "No conversational content"
+    if not prd_markdown_part:
+        return "AI response did not contain an updated PRD"
+
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT_PRD},
+        {"role": "assistant", "content": INITIAL_ASSISTANT_MESSAGE_CONVO},
+        {"role": "user", "content": brief},
+        {"role": "assistant", "content": conversational_part},
+    ]
+    success = storage.create_chat_session(
+        chat_id=chat_id,
+        name=name,
+        messages=messages,
+        last_response_id=response_id,
+        initial_prd_markdown=prd_markdown_part
+    )
+    if not success:
+        return "Failed to save chat session to storage"
+    return None
+
+
+def _run_item(batch_id: str, item: dict, brief: str, initial_response_id: str):
+    index = item["index"]
+    _set_item(batch_id, index, ITEM_RUNNING)
+    try:
+        error = _generate_first_draft(item["chat_id"], item["name"], brief, initial_response_id)
+    except Exception as e:
+        logger.exception("Unexpected error processing batch %s item %s", batch_id, index)
+        error = f"Unexpected error: {e}"
+    if error:
+        _set_item(batch_id, index, ITEM_FAILED, error=error)
+    else:
+        _set_item(batch_id, index, ITEM_SUCCEEDED)
+
+
+def _start_batch(batch_id: str, items: list[dict], briefs: list[str]):
+    """
+    Makes the create-chat call once for the whole batch, then queues every brief's first turn
+    chained to that response. The Responses API lets any number of responses share one
+    previous_response_id, so each draft still gets its own chain from there on.
+    """
+    try:
+        _, _, initial_response_id, error = _call_with_retries(
+            f"batch {batch_id}", "create", [{"type": "message", "role": "system", "content": SYSTEM_PROMPT_PRD}], None
+        )
+    except Exception as e:
+        logger.exception("Unexpected error starting batch %s", batch_id)
+        initial_response_id, error = None, f"Unexpected error: {e}"
+    if error or not initial_response_id:
+        error = error or "Failed to initialize chat context with AI"
+        logger.error("Batch %s failed to start: %s", batch_id, error)
+        for item in items:
+            _set_item(batch_id, item["index"], ITEM_FAILED, error=error)
+        return
+
+    for item, brief in zip(items, briefs):
+        _executor.submit(_run_item, batch_id, item, brief, initial_response_id)
+
+
+def submit_batch(briefs: list[dict]) -> dict | None:
+    """
+    Queues one PRD draft per brief (dicts with 'brief' and optional 'name') and returns the batch status,
+    or None if the batch could not be stored.
+    The create-chat call is made once per batch; each brief then needs one model call.
+    Items run on a shared, bounded worker pool, so total model concurrency is capped
+    no matter how many batches are submitted. Status is kept in Table Storage, so any
+    worker can report it; the briefs themselves stay with the submitting worker, and items
+    it had not finished when it stopped remain 'queued' or 'running'.
+    """
+    batch_id = str(uuid.uuid4())
+    items = []
+    for index, entry in enumerate(briefs):
+        chat_id = str(uuid.uuid4())
+        name = entry.get("name") or f"PRD Chat - {chat_id[:8]}"
+        items.append({"index": index, "chat_id": chat_id, "name": name, "status": ITEM_QUEUED})
+
+    if not storage.create_batch(batch_id, time.time(), items):
+        return None
+
+    logger.info("Submitting batch %s with %s briefs (concurrency %s)", batch_id, len(items), BATCH_CONCURRENCY)
+    _executor.submit(_start_batch, batch_id, items, [entry["brief"] for entry in briefs])
+    return get_batch_status(batch_id)
+
+
+def get_batch_status(batch_id: str) -> dict | None:
+    """Returns a snapshot of batch progress and per-item status, or None if the batch is unknown."""
+    batch = storage.get_batch(batch_id)
+    if not batch:
+        return None
+    items = batch["items"]
+    counts = {status: 0 for status in (ITEM_QUEUED, ITEM_RUNNING, ITEM_SUCCEEDED, ITEM_FAILED)}
+    for item in items:
+        counts[item["status"]] += 1
+    completed = counts[ITEM_SUCCEEDED] + counts[ITEM_FAILED]
+    done = completed == len(items)
+    return {
+        "id": batch["id"],
+        "total": len(items),
+        "completed": completed,
+        "counts": counts,
+        "done": done,
+        "created_at": batch["created_at"],
+        "finished_at": max((item["finished_at"] or 0 for item in items), default=batch["created_at"]) if done else None,
+        "items": [{key: item[key] for key in ("index", "chat_id", "name", "status", "error")} for item in items],
+    }
@@ -0,0 +1,133 @@
+import html
+import json
+import logging
+import re
+import zipfile
+from datetime import datetime
+
+import storage
+from prd import INITIAL_PRD_MARKDOWN
+from log_config import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ("ndjson", "markdown", "html")
+
+# Columns needed per format. Zip exports only need the PRD, so skip the message history.
+_NDJSON_COLUMNS = ["RowKey", "Name", "Messages", "LastResponseId", "LatestPrdMarkdown"]
+_DOCUMENT_COLUMNS = ["RowKey", "Name", "LatestPrdMarkdown"]
+
+HTML_DOCUMENT_TEMPLATE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+</head>
+<body>
+<pre style="white-space: pre-wrap; font-family: inherit;">{body}</pre>
+</body>
+</html>
+"""
+
+
+class _ZipStreamBuffer:
+    """
+    Write-only, non-seekable sink for zipfile.ZipFile.
+    ZipFile falls back to data descriptors when it cannot seek, so each entry can be
+    flushed to the client as soon as it is written instead of building the archive in memory.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _iter_filtered_sessions(columns: list[str], since: datetime | None, until: datetime | None, name_contains: str | None):
+    """Scans storage with the date filters pushed down and applies the name filter locally."""
+    needle = name_contains.casefold() if name_contains else None
+    for entity in storage.iter_chat_sessions(select=columns, modified_since=since, modified_before=until):
+        name = entity.get("Name") or "Untitled Chat"
+        if needle and needle not in name.casefold():
+            continue
+        yield entity
+
+
+def _safe_filename(name: str, chat_id: str, extension: str) -> str:
+    """Builds a unique, filesystem-safe entry name for a chat."""
+    slug = re.sub(r"[^A-Za-z0-9._-]+", "-", name).strip("-")[:60] or "chat"
+    return f"{slug}-{chat_id}.{extension}"
+
+
+def _timestamp_iso(entity) -> str | None:
+    timestamp = entity.get("Timestamp")
+    return timestamp.isoformat() if timestamp else None
+
+
+def iter_ndjson_export(since: datetime | None = None, until: datetime | None = None, name_contains: str | None = None):
+    """Yields one JSON line (bytes) per chat session, including message history and latest PRD."""
+    exported = 0
+    for entity in _iter_filtered_sessions(_NDJSON_COLUMNS, since, until, name_contains):
+        record = {
+            "id": entity["RowKey"],
+            "name": entity.get("Name") or "Untitled Chat",
+            "updated_at": _timestamp_iso(entity),
+            "last_response_id": entity.get("LastResponseId") or None,
+            "messages": entity.get("Messages", []),
+            "prd_markdown": entity.get("LatestPrdMarkdown") or INITIAL_PRD_MARKDOWN,
+        }
+        exported += 1
+        yield (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+    logger.info("NDJSON export finished. Exported %s chat sessions.", exported)
+
+
+def iter_zip_export(
+    export_format: str,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    name_contains: str | None = None,
+):
+    """
+    Yields a zip archive in chunks, one PRD document per chat session.
+    `export_format` is 'markdown' or 'html'.
+    """
+    extension = "md" if export_format == "markdown" else "html"
+    buffer = _ZipStreamBuffer()
+    exported = 0
+    with zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for entity in _iter_filtered_sessions(_DOCUMENT_COLUMNS, since, until, name_contains):
+            chat_id = entity["RowKey"]
+            name = entity.get("Name") or "Untitled Chat"
+            markdown = entity.get("LatestPrdMarkdown") or INITIAL_PRD_MARKDOWN
+            if export_format == "html":
+                content = HTML_DOCUMENT_TEMPLATE.format(title=html.escape(name), body=html.escape(markdown))
+            else:
+                content = markdown
+
+            entry = zipfile.ZipInfo(_safe_filename(name, chat_id, extension))
+            timestamp = entity.get("Timestamp")
+            if timestamp and timestamp.year >= 1980:
+                entry.date_time = timestamp.timetuple()[:6]
+            entry.compress_type = zipfile.ZIP_DEFLATED
+            archive.writestr(entry, content.encode("utf-8"))
+            exported += 1
+
+            chunk = buffer.drain()
+            if chunk:
+                yield chunk
+    # Closing the archive writes the central directory.
+    tail = buffer.drain()
+    if tail:
+        yield tail
+    logger.info("Zip (%s) export finished. Exported %s chat sessions.", export_format, exported)
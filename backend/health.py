@@ -0,0 +1,70 @@
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import prd
+import storage
+from log_config import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+READINESS_CACHE_SECONDS = float(os.getenv("READINESS_CACHE_SECONDS", "5")) # Reuse a readiness result for this long
+
+# Each check returns an error message, or None when the dependency is reachable.
+DEPENDENCY_CHECKS = {
+    "table_storage": storage.check_health,
+    "azure_openai": prd.check_health,
+}
+
+STARTED_AT = time.time()
+
+_last_readiness = None
+_readiness_lock = threading.Lock()
+
+
+def _timed(check) -> dict:
+    start = time.perf_counter()
+    try:
+        error = check()
+    except Exception as e:
+        error = f"Unexpected error: {e}"
+    return {"ok": error is None, "latency_ms": round((time.perf_counter() - start) * 1000, 1), "error": error}
+
+
+def check_dependencies() -> dict:
+    """Checks every dependency concurrently and reports per-dependency status and latency."""
+    with ThreadPoolExecutor(max_workers=len(DEPENDENCY_CHECKS)) as executor:
+        futures = {name: executor.submit(_timed, check) for name, check in DEPENDENCY_CHECKS.items()}
+        dependencies = {name: future.result() for name, future in futures.items()}
+    return {
+        "ready": all(dep["ok"] for dep in dependencies.values()),
+        "checked_at": time.time(),
+        "dependencies": dependencies,
+    }
+
+
+def get_readiness(max_age: float = READINESS_CACHE_SECONDS) -> dict:
+    """Returns the latest readiness result, re-checking dependencies if it is older than `max_age` seconds."""
+    global _last_readiness
+    with _readiness_lock:
+        if _last_readiness and time.time() - _last_readiness["checked_at"] < max_age:
+            return _last_readiness
+        _last_readiness = check_dependencies()
+        return _last_readiness
+
+
+def warm_up() -> dict:
+    """
+    Creates the shared clients and opens their connection pools before the worker serves traffic.
+    Failures are logged rather than raised, so the worker still starts and /readyz reports the problem.
+    """
+    readiness = get_readiness(max_age=0)
+    for name, dep in readiness["dependencies"].items():
+        if dep["ok"]:
+            logger.info("Warm-up: %s ready in %s ms", name, dep["latency_ms"])
+        else:
+            logger.error("Warm-up: %s not ready after %s ms: %s", name, dep["latency_ms"], dep["error"])
+    return readiness
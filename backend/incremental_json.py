@@ -0,0 +1,153 @@
+import json
+
+_WHITESPACE = " \t\r\n"
+_LITERAL_END = ",}]" + _WHITESPACE
+
+
+class IncrementalJsonParser:
+    """
+    Parses a single JSON object fed in arbitrary chunks (e.g. streamed model output).
+
+    `feed()` returns every member value completed by that chunk as a (path, value) pair,
+    where path is a tuple of object keys / array indexes from the root. Only members at
+    depth <= `max_depth` are reported, so a caller can act on `("message",)` or
+    `("prd_sections", "product_name")` as soon as its closing character arrives,
+    without waiting for the rest of the document. Raises ValueError on malformed input.
+    """
+
+    def __init__(self, max_depth: int = 2):
+        self.max_depth = max_depth
+        self.done = False
+        self._chunks = []
+        self._length = 0
+        self._joined = ""
+        self._stack = [] # Frames for the currently open objects/arrays
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._string_is_key = False
+        self._in_literal = False
+        self._emitted = []
+
+    def _text(self, start: int, end: int) -> str:
+        if len(self._joined) < end:
+            self._joined = "".join(self._chunks)
+            self._chunks = [self._joined]
+        return self._joined[start:end]
+
+    def feed(self, chunk: str) -> list[tuple[tuple, object]]:
+        """Consumes the next chunk and returns the member values it completed."""
+        offset = self._length
+        self._chunks.append(chunk)
+        self._length += len(chunk)
+        self._emitted = []
+        for i, char in enumerate(chunk):
+            self._consume(char, offset + i)
+        return self._emitted
+
+    def _consume(self, char: str, pos: int):
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif char == "\\":
+                self._escape = True
+            elif char == '"':
+                self._in_string = False
+                if self._string_is_key:
+                    frame = self._stack[-1]
+                    frame["key"] = json.loads(self._text(self._string_start, pos + 1))
+                    frame["expect"] = "colon"
+                else:
+                    self._end_value(pos + 1)
+            return
+
+        if self._in_literal:
+            if char not in _LITERAL_END:
+                return
+            self._in_literal = False
+            self._end_value(pos)
+
+        if char in _WHITESPACE:
+            return
+        if self.done:
+            raise ValueError(f"Unexpected data after end of JSON document at position {pos}")
+
+        if not self._stack:
+            if char != "{":
+                raise ValueError(f"Expected '{{' at position {pos}, got {char!r}")
+            self._stack.append({"type": "{", "path": (), "key": None, "index": 0, "expect": "key", "value_start": pos})
+            return
+
+        frame = self._stack[-1]
+        expect = frame["expect"]
+        if frame["type"] == "{":
+            if expect == "key" and char == '"':
+                self._in_string = True
+                self._string_is_key = True
+                self._string_start = pos
+            elif expect in ("key", "comma") and char == "}":
+                self._close(pos)
+            elif expect == "colon" and char == ":":
+                frame["expect"] = "value"
+            elif expect == "value":
+                self._begin_value(frame, char, pos)
+            elif expect == "comma" and char == ",":
+                frame["expect"] = "key"
+            else:
+                raise ValueError(f"Unexpected {char!r} at position {pos}")
+        else:
+            if expect == "first" and char == "]":
+                self._close(pos)
+            elif expect in ("value", "first"):
+                self._begin_value(frame, char, pos)
+            elif expect == "comma" and char == ",":
+                frame["expect"] = "value"
+            elif expect == "comma" and char == "]":
+                self._close(pos)
+            else:
+                raise ValueError(f"Unexpected {char!r} at position {pos}")
+
+    def _member_path(self, frame: dict) -> tuple:
+        return frame["path"] + ((frame["key"],) if frame["type"] == "{" else (frame["index"],))
+
+    def _begin_value(self, frame: dict, char: str, pos: int):
+        frame["value_start"] = pos
+        frame["expect"] = "in_value"
+        if char == '"':
+            self._in_string = True
+            self._string_is_key = False
+        elif char in "{[":
+            self._stack.append({
+                "type": char,
+                "path": self._member_path(frame),
+                "key": None,
+                "index": 0,
+                "expect": "key" if char == "{" else "first",
+                "value_start": pos,
+            })
+        elif char in "-0123456789tfn":
+            self._in_literal = True
+        else:
+            raise ValueError(f"Unexpected {char!r} at position {pos}")
+
+    def _end_value(self, end: int):
+        frame = self._stack[-1]
+        path = self._member_path(frame)
+        if len(path) <= self.max_depth:
+            self._emitted.append((path, json.loads(self._text(frame["value_start"], end))))
+        frame["expect"] = "comma"
+        if frame["type"] == "[":
+            frame["index"] += 1
+
+    def _close(self, pos: int):
+        self._stack.pop()
+        if self._stack:
+            self._end_value(pos + 1)
+        else:
+            self.done = True
+
+    def close(self) -> dict:
+        """Returns the fully parsed document, raising ValueError if it is incomplete."""
+        if not self.done:
+            raise ValueError("JSON document is incomplete")
+        return json.loads(self._text(0, self._length))
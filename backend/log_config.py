@@ -0,0 +1,211 @@
+import os
+import json
+import queue
+import atexit
+import random
+import hashlib
+import logging
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from dotenv import load_dotenv
+
+import metrics
+
+load_dotenv()
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower() # 'json' for structured records, 'text' for plain lines
+# Per-logger sampling for records below WARNING, e.g. "storage=0.1,prd=0.5". Unlisted loggers keep everything.
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
+LOG_MAX_PAYLOAD_CHARS = int(os.getenv("LOG_MAX_PAYLOAD_CHARS", "512")) # Longer payloads are truncated and hashed
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000")) # Records waiting for the writer thread; further records are dropped and counted
+
+# Attributes every LogRecord has; anything else was passed via `extra=` and goes into the JSON record.
+_STANDARD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+_setup_lock = threading.Lock()
+_queue_handler = None
+
+
+class Payload:
+    """
+    Defers serializing a (possibly large) value until a record is actually emitted.
+    Pass it as a logging argument: logger.debug("Input: %s", Payload(data)). When rendered,
+    values longer than LOG_MAX_PAYLOAD_CHARS are truncated and tagged with their size and hash,
+    so log volume no longer grows with prompt size.
+    """
+
+    __slots__ = ("value", "limit")
+
+    def __init__(self, value, limit: int = LOG_MAX_PAYLOAD_CHARS):
+        self.value = value
+        self.limit = limit
+
+    def __str__(self) -> str:
+        text = self.value if isinstance(self.value, str) else json.dumps(self.value, default=str, ensure_ascii=False)
+        if len(text) <= self.limit:
+            return text
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+        return f"{text[:self.limit]}... [truncated, {len(text)} chars, sha256={digest}]"
+
+    __repr__ = __str__
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats each record as one JSON object per line, including any `extra=` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack_info"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps a configured fraction of sub-WARNING records per logger (longest name prefix wins).
+    Warnings and errors are never sampled out.
+    """
+
+    def __init__(self, rates: dict[str, float]):
+        super().__init__()
+        self.rates = sorted(rates.items(), key=lambda item: len(item[0]), reverse=True)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        for prefix, rate in self.rates:
+            if record.name == prefix or record.name.startswith(prefix + "."):
+                return rate >= 1 or random.random() < rate
+        return True
+
+
+class _SentinelBlockingListener(QueueListener):
+    """Waits for room in the bounded queue to enqueue its stop sentinel instead of failing when it is full."""
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """
+    Enqueues records untouched so message formatting happens on the listener thread.
+    The stock QueueHandler formats in the caller's thread to make records picklable,
+    which is unnecessary for an in-process queue.
+
+    The queue is bounded: when the writer falls behind, records are dropped and counted
+    (metric logging.dropped_records) rather than growing memory. The listener thread is
+    started lazily by the first record in each process, so a worker forked after import
+    (e.g. gunicorn --preload) gets its own queue and writer instead of the parent's dead thread.
+    """
+
+    def __init__(self, target: logging.Handler, maxsize: int):
+        super().__init__(queue.Queue(maxsize))
+        self.target = target
+        self.maxsize = maxsize
+        self.listener = None
+        self.pid = None # Process that owns the current queue and listener
+        self.start_lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        if self.pid != os.getpid():
+            self._start_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.increment("logging.dropped_records")
+
+    def _start_listener(self):
+        with self.start_lock:
+            if self.pid == os.getpid():
+                return
+            if self.pid is not None:
+                # Inherited across fork: the parent's queue may hold its records (or a held lock) and its thread is gone
+                self.queue = queue.Queue(self.maxsize)
+            self.listener = _SentinelBlockingListener(self.queue, self.target, respect_handler_level=True)
+            self.listener.start()
+            self.pid = os.getpid()
+
+    def after_fork_in_child(self):
+        # A thread in the parent may have held the lock at fork time
+        self.start_lock = threading.Lock()
+
+    def stop_listener(self):
+        """Flushes and stops this process's listener; a no-op in processes that never logged."""
+        with self.start_lock:
+            if self.listener is not None and self.pid == os.getpid():
+                self.listener.stop()
+                self.listener = None
+                self.pid = None
+
+
+def _parse_sample_rates(spec: str) -> dict[str, float]:
+    rates = {}
+    for part in spec.split(","):
+        name, _, rate = part.partition("=")
+        if not name.strip() or not rate.strip():
+            continue
+        try:
+            rates[name.strip()] = max(0.0, min(1.0, float(rate)))
+        except ValueError:
+            continue
+    return rates
+
+
+def _stop_queue_listener():
+    if _queue_handler is not None:
+        _queue_handler.stop_listener()
+
+
+def _reset_after_fork():
+    global _setup_lock
+    _setup_lock = threading.Lock()
+    if _queue_handler is not None:
+        _queue_handler.after_fork_in_child()
+
+
+def setup_logging():
+    """
+    Configures root logging once: the request thread only filters and enqueues records,
+    while a background listener (started lazily in each process) formats them and
+    writes to stderr. Safe to call from every module.
+    """
+    global _queue_handler
+    with _setup_lock:
+        if _queue_handler is not None:
+            return
+
+        stream_handler = logging.StreamHandler()
+        if LOG_FORMAT == "text":
+            stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+        else:
+            stream_handler.setFormatter(JsonFormatter())
+
+        queue_handler = _DeferredQueueHandler(stream_handler, LOG_QUEUE_SIZE)
+        queue_handler.addFilter(SamplingFilter(_parse_sample_rates(LOG_SAMPLE_RATES)))
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(queue_handler)
+        root.setLevel(LOG_LEVEL)
+
+        _queue_handler = queue_handler
+        atexit.register(_stop_queue_listener)
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=_reset_after_fork)
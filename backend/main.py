@@ -1,25 +1,46 @@
 import os
 import uuid
+import time
+import asyncio
 import logging
-from fastapi import FastAPI, HTTPException, Body, Path
+from concurrent.futures import Future
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from fastapi import FastAPI, HTTPException, Body, Path, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
 from typing import List, Optional
 import uvicorn
+import anyio.to_thread
 
 # Import helpers from other modules
 from prd import (
-    get_prd_update, SYSTEM_PROMPT_PRD,
+    get_prd_update, get_structured_prd_update, render_prd_markdown,
+    get_conversational_reply, message_has_prd_information, schedule_prd_rewrite,
+    STRUCTURED_OUTPUT_ENABLED, PRD_PIPELINE_MODE, SYSTEM_PROMPT_PRD,
     INITIAL_ASSISTANT_MESSAGE_CONVO, # Use this for the first display message
     INITIAL_PRD_MARKDOWN, # Use this for initial storage
     # INITIAL_ASSISTANT_PRD_OUTPUT is no longer directly stored
 )
 import storage
+import export
+import batch
+import metrics
+import prd_status
+import health
+import admission
+import archive
+from log_config import setup_logging
 
 # Setup logging
-logging.basicConfig(level=logging.INFO)
+setup_logging()
 logger = logging.getLogger(__name__)
 
+# Opt-in: include a locally computed "missing sections" note with each user turn
+PRD_STATUS_HINTS_ENABLED = os.getenv("PRD_STATUS_HINTS", "false").lower() in ("1", "true", "yes")
+
 # --- Pydantic Models ---
 
 class ChatMessage(BaseModel):
@@ -49,16 +70,88 @@ class AssistantResponse(BaseModel):
 
 class PrdContent(BaseModel):
     markdown: str = Field(..., description="The compiled PRD content in Markdown format")
+    pending: bool = Field(False, description="Whether a background PRD update from a recent message has not been stored yet")
+
+class PrdSectionStatus(BaseModel):
+    name: str = Field(..., description="Section heading from the PRD template")
+    present: bool = Field(..., description="Whether the section heading was found in the PRD")
+    completeness: float = Field(..., description="Fraction of the section's fields filled in (0.0-1.0)")
+    filled_fields: List[str] = Field(..., description="Template fields that no longer hold their placeholder")
+    missing_fields: List[str] = Field(..., description="Template fields still holding their placeholder")
+
+class PrdStatus(BaseModel):
+    completeness: float = Field(..., description="Fraction of all template fields filled in (0.0-1.0)")
+    filled_fields: int = Field(..., description="Number of template fields filled in")
+    total_fields: int = Field(..., description="Number of fields in the PRD template")
+    content_hash: str = Field(..., description="SHA-256 of the analyzed PRD markdown")
+    sections: List[PrdSectionStatus] = Field(..., description="Per-section completeness")
+
+class BatchBrief(BaseModel):
+    brief: str = Field(..., min_length=1, description="Seed brief describing the product idea")
+    name: Optional[str] = Field(None, description="Optional name for the resulting chat session")
+
+class BatchRequest(BaseModel):
+    briefs: List[BatchBrief] = Field(..., min_length=1, max_length=batch.BATCH_MAX_ITEMS, description="Briefs to turn into first-draft PRDs")
+
+class BatchItemStatus(BaseModel):
+    index: int = Field(..., description="Position of the brief in the submitted list")
+    chat_id: str = Field(..., description="ID of the chat session created for this brief")
+    name: str = Field(..., description="Name of the chat session")
+    status: str = Field(..., description="One of 'queued', 'running', 'succeeded', 'failed'")
+    error: Optional[str] = Field(None, description="Failure reason, if the item failed")
+
+class BatchStatus(BaseModel):
+    id: str = Field(..., description="Unique ID of the batch")
+    total: int = Field(..., description="Number of briefs in the batch")
+    completed: int = Field(..., description="Number of briefs that have finished (succeeded or failed)")
+    counts: dict[str, int] = Field(..., description="Item counts per status")
+    done: bool = Field(..., description="Whether every item has finished")
+    created_at: float = Field(..., description="Submission time (Unix seconds)")
+    finished_at: Optional[float] = Field(None, description="Completion time (Unix seconds)")
+    items: List[BatchItemStatus] = Field(..., description="Per-brief status")
 
 
 # --- FastAPI App Initialization ---
 
+async def _run_tiering_job():
+    """Periodically moves idle chat sessions to the archive (see storage.archive_idle_sessions)."""
+    while True:
+        await asyncio.sleep(storage.ARCHIVE_INTERVAL_SECONDS)
+        try:
+            await run_in_threadpool(storage.archive_idle_sessions)
+        except Exception:
+            logger.exception("Tiering job failed")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warms up shared clients before the worker starts accepting requests."""
+    # Sync endpoints and streamed exports share one thread pool; make sure it can hold every admission pool at once
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    limiter.total_tokens = max(
+        limiter.total_tokens,
+        admission.LLM_MAX_CONCURRENCY + admission.STORAGE_MAX_CONCURRENCY + admission.EXPORT_MAX_CONCURRENCY,
+    )
+    if storage.ARCHIVE_INTERVAL_SECONDS > 0 and not archive.ARCHIVE_DIR:
+        logger.critical("PRD_ARCHIVE_INTERVAL_SECONDS is set but PRD_ARCHIVE_DIR is not. Cannot start server.")
+        raise RuntimeError("PRD_ARCHIVE_DIR must point to shared, persistent storage when session tiering is enabled")
+    await run_in_threadpool(health.warm_up)
+    tiering_task = asyncio.create_task(_run_tiering_job()) if storage.ARCHIVE_INTERVAL_SECONDS > 0 else None
+    yield
+    if tiering_task:
+        tiering_task.cancel()
+
 app = FastAPI(
     title="PRD Generator API",
     description="API for managing PRD chat sessions using Azure OpenAI Responses API and Azure Table Storage",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+# --- Admission Control ---
+# Separate pools for LLM-bound and storage-only requests, so a slow model cannot starve reads.
+# Added before CORS so that shed (503) responses still carry CORS headers.
+app.add_middleware(admission.AdmissionMiddleware)
+
 # --- CORS Middleware --- 
 # Allow all origins for simplicity in POC, adjust for production
 app.add_middleware(
@@ -69,6 +162,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.exception_handler(archive.ArchiveUnavailableError)
+async def archive_unavailable_handler(request: Request, exc: archive.ArchiveUnavailableError):
+    # An archived chat that cannot be read still exists; report a retryable outage rather than a 404
+    logger.error("Archive unavailable while handling %s %s: %s", request.method, request.url.path, exc)
+    return JSONResponse(status_code=503, content={"detail": "Archived chat session is temporarily unavailable"})
+
 # --- API Endpoints ---
 
 @app.post("/api/chats", response_model=ChatInfo, status_code=201)
@@ -81,7 +180,7 @@ def create_new_chat(request_body: NewChatRequest = Body(None)):
     """
     chat_id = str(uuid.uuid4())
     chat_name = request_body.name if request_body and request_body.name else f"PRD Chat - {chat_id[:8]}"
-    logger.info(f"Attempting to create new chat: {chat_id} named '{chat_name}'")
+    logger.info("Attempting to create new chat: %s named '%s'", chat_id, chat_name)
 
     initial_api_input = [{"type": "message", "role": "system", "content": SYSTEM_PROMPT_PRD}]
 
@@ -94,7 +193,7 @@ def create_new_chat(request_body: NewChatRequest = Body(None)):
     )
 
     if error or not initial_response_id:
-        logger.error(f"Failed to establish initial context chain with API for chat {chat_id}: {error}")
+        logger.error("Failed to establish initial context chain with API for chat %s: %s", chat_id, error)
         raise HTTPException(status_code=500, detail=f"Failed to initialize chat context with AI: {error}")
 
     # Store the system prompt and the initial *conversational* message.
@@ -112,10 +211,10 @@ def create_new_chat(request_body: NewChatRequest = Body(None)):
         initial_prd_markdown=INITIAL_PRD_MARKDOWN # Store the initial template
     )
     if not success:
-        logger.error(f"Failed to save new chat session {chat_id} to storage.")
+        logger.error("Failed to save new chat session %s to storage.", chat_id)
         raise HTTPException(status_code=500, detail="Failed to save chat session to storage")
 
-    logger.info(f"Successfully created and saved chat: {chat_id}, initial response ID: {initial_response_id}")
+    logger.info("Successfully created and saved chat: %s, initial response ID: %s", chat_id, initial_response_id)
     return ChatInfo(id=chat_id, name=chat_name)
 
 @app.get("/api/chats", response_model=List[ChatInfo])
@@ -127,10 +226,10 @@ def get_all_chats():
 @app.get("/api/chats/{chat_id}", response_model=ChatSessionDetail)
 def get_chat_details(chat_id: str = Path(..., description="The unique ID of the chat session")):
     """Retrieves the full details (messages, name) for a specific chat session."""
-    logger.info(f"Attempting to retrieve chat details for: {chat_id}")
+    logger.info("Attempting to retrieve chat details for: %s", chat_id)
     session_data = storage.get_chat_session(chat_id)
     if not session_data:
-        logger.warning(f"Chat not found: {chat_id}")
+        logger.warning("Chat not found: %s", chat_id)
         raise HTTPException(status_code=404, detail="Chat session not found")
     
     # Map the raw storage data (dict) to the Pydantic model
@@ -147,17 +246,17 @@ def rename_chat(
     request_body: RenameRequest = Body(...)
 ):
     """Renames a specific chat session."""
-    logger.info(f"Attempting to rename chat {chat_id} to '{request_body.new_name}'")
+    logger.info("Attempting to rename chat %s to '%s'", chat_id, request_body.new_name)
     success = storage.rename_chat_session(chat_id, request_body.new_name)
     if not success:
         # Could be not found or other storage error
-        logger.warning(f"Failed to rename chat {chat_id}. It might not exist or storage failed.")
+        logger.warning("Failed to rename chat %s. It might not exist or storage failed.", chat_id)
         # Check if it exists first to give a more specific error
         if storage.get_chat_session(chat_id) is None:
              raise HTTPException(status_code=404, detail="Chat session not found")
         else:
              raise HTTPException(status_code=500, detail="Failed to rename chat session in storage")
-    logger.info(f"Successfully renamed chat {chat_id}")
+    logger.info("Successfully renamed chat %s", chat_id)
     return # Return 204 No Content on success
 
 @app.post("/api/chats/{chat_id}/messages", response_model=AssistantResponse)
@@ -170,10 +269,10 @@ def post_user_message(
     stores conversational part in messages, updates latest PRD in session,
     and returns only the conversational part.
     """
-    logger.info(f"Received message for chat {chat_id}")
+    logger.info("Received message for chat %s", chat_id)
     session_data = storage.get_chat_session(chat_id)
     if not session_data:
-        logger.warning(f"Chat not found when posting message: {chat_id}")
+        logger.warning("Chat not found when posting message: %s", chat_id)
         raise HTTPException(status_code=404, detail="Chat session not found")
 
     messages = session_data.get('Messages', [])
@@ -183,18 +282,37 @@ def post_user_message(
     user_message_dict = {"role": "user", "content": user_message.content}
     messages.append(user_message_dict)
 
+    if PRD_PIPELINE_MODE != "single":
+        return _post_user_message_split(chat_id, session_data, messages, user_message.content)
+
     # Prepare API input (just the user message)
     api_input = [{"type": "message", "role": "user", "content": user_message.content}]
-
-    logger.info(f"Sending message to OpenAI for chat {chat_id}. Last Response ID: {last_response_id}")
+    if PRD_STATUS_HINTS_ENABLED:
+        # Tell the model which sections are still open so it does not re-ask about filled ones
+        hint = prd_status.missing_sections_hint(prd_status.analyze_prd(
+            session_data.get('LatestPrdMarkdown') or INITIAL_PRD_MARKDOWN,
+            session_data.get('LatestPrdSections'),
+        ))
+        if hint:
+            api_input.insert(0, {"type": "message", "role": "system", "content": hint})
+
+    logger.info("Sending message to OpenAI for chat %s. Last Response ID: %s", chat_id, last_response_id)
     # Get both parts from the AI response
-    conversational_part, prd_markdown_part, new_response_id, error = get_prd_update(
-        input_data=api_input,
-        previous_response_id=last_response_id
-    )
+    prd_sections = None
+    if STRUCTURED_OUTPUT_ENABLED:
+        conversational_part, prd_sections, new_response_id, error = get_structured_prd_update(
+            input_data=api_input,
+            previous_response_id=last_response_id
+        )
+        prd_markdown_part = render_prd_markdown(prd_sections) if prd_sections else None
+    else:
+        conversational_part, prd_markdown_part, new_response_id, error = get_prd_update(
+            input_data=api_input,
+            previous_response_id=last_response_id
+        )
 
     if error or conversational_part is None: # Check if conversational part exists
-        logger.error(f"Failed to get AI response for chat {chat_id}: {error}")
+        logger.error("Failed to get AI response for chat %s: %s", chat_id, error)
         raise HTTPException(status_code=500, detail=f"Failed to get AI response: {error or 'No conversational content'}")
 
     # Append only the conversational part to the message history
@@ -203,22 +321,101 @@ def post_user_message(
 
     # Update the session in storage with new messages, new response ID,
     # and the latest full PRD markdown.
-    logger.info(f"Updating chat session {chat_id} in storage. New Response ID: {new_response_id}")
+    logger.info("Updating chat session %s in storage. New Response ID: %s", chat_id, new_response_id)
     success = storage.update_chat_session(
         chat_id=chat_id,
         messages=messages,
         last_response_id=new_response_id,
-        latest_prd_markdown=prd_markdown_part # Pass the PRD part here
+        latest_prd_markdown=prd_markdown_part, # Pass the PRD part here
+        latest_prd_sections=prd_sections
     )
 
     if not success:
-        logger.error(f"Failed to update chat session {chat_id} in storage after getting AI response.")
+        logger.error("Failed to update chat session %s in storage after getting AI response.", chat_id)
         raise HTTPException(status_code=500, detail="Failed to save updated chat session to storage")
 
-    logger.info(f"Successfully processed message and updated chat {chat_id}")
+    logger.info("Successfully processed message and updated chat %s", chat_id)
     # Return ONLY the conversational part to the frontend
     return AssistantResponse(content=conversational_part)
 
+def _schedule_background_prd_rewrite(chat_id: str, content: str, turn: int, confirmation: Future | None = None):
+    """
+    Queues a PRD rewrite that reads the latest stored PRD and merges the result back into storage.
+    With a `confirmation`, the result is only stored once the turn is confirmed saved.
+    Storing it (or giving up) marks `turn` applied, which clears the PRD's pending flag.
+    """
+    loaded = {} # PRD and ETag the current rewrite is based on; rewrites for one chat run one at a time per worker
+
+    def load_current_prd():
+        current = storage.get_prd_for_update(chat_id)
+        if current is None:
+            return None
+        loaded["markdown"], loaded["etag"] = current
+        return loaded["markdown"] or INITIAL_PRD_MARKDOWN
+
+    def store_prd(markdown: str | None, turn: int | None) -> bool:
+        if markdown is None:
+            # The rewrite failed or was given up; clear the pending flag so clients stop waiting for it
+            if turn is not None:
+                storage.mark_prd_turn_applied(chat_id, turn)
+            return True
+        # Conditional on the loaded ETag, so a rewrite on another worker is never silently overwritten
+        result = storage.update_prd_markdown(chat_id, markdown, etag=loaded["etag"], base_markdown=loaded["markdown"], prd_applied_turn=turn)
+        if result is None:
+            return False
+        if not result:
+            logger.error("Failed to store background PRD rewrite for chat %s", chat_id)
+        return True
+
+    schedule_prd_rewrite(chat_id, content, load_current_prd, store_prd, confirmation=confirmation, turn=turn)
+
+def _post_user_message_split(chat_id: str, session_data: dict, messages: list, content: str) -> AssistantResponse:
+    """
+    Split-model turn: the fast deployment answers the user while the PRD rewrite runs
+    in the background, so reply latency does not depend on PRD size. The rewrite is
+    skipped when the message carries no PRD information. The Responses chain
+    (LastResponseId) is not advanced in this mode; the reply model gets recent
+    history and the current PRD instead.
+    """
+    rewrite_needed = message_has_prd_information(content)
+    turn = len(messages) # Identifies this turn's rewrite in PrdRequestedTurn/PrdAppliedTurn; grows with every turn
+    reply_saved = None
+    if not rewrite_needed:
+        metrics.increment("pipeline.rewrites_skipped")
+    elif PRD_PIPELINE_MODE == "parallel":
+        # Runs alongside the reply; its result is dropped if this turn is not saved
+        reply_saved = Future()
+        _schedule_background_prd_rewrite(chat_id, content, turn, confirmation=reply_saved)
+
+    saved = False
+    try:
+        current_prd_markdown = session_data.get('LatestPrdMarkdown') or INITIAL_PRD_MARKDOWN
+        reply, error = get_conversational_reply(messages, current_prd_markdown)
+        if error or not reply:
+            logger.error("Failed to get AI reply for chat %s: %s", chat_id, error)
+            raise HTTPException(status_code=500, detail=f"Failed to get AI response: {error or 'No conversational content'}")
+
+        messages.append({"role": "assistant", "content": reply})
+        saved = storage.update_chat_session(
+            chat_id=chat_id,
+            messages=messages,
+            last_response_id=session_data.get('LastResponseId'),
+            latest_prd_markdown=None, # Written by the background rewrite
+            prd_requested_turn=turn if rewrite_needed else None
+        )
+        if not saved:
+            logger.error("Failed to update chat session %s in storage after getting AI reply.", chat_id)
+            raise HTTPException(status_code=500, detail="Failed to save updated chat session to storage")
+    finally:
+        if reply_saved is not None:
+            reply_saved.set_result(saved)
+
+    if rewrite_needed and PRD_PIPELINE_MODE == "deferred":
+        _schedule_background_prd_rewrite(chat_id, content, turn)
+
+    logger.info("Successfully processed message for chat %s (%s pipeline, PRD rewrite %s)", chat_id, PRD_PIPELINE_MODE, 'queued' if rewrite_needed else 'skipped')
+    return AssistantResponse(content=reply)
+
 @app.get("/api/chats/{chat_id}/prd", response_model=PrdContent)
 def get_prd_markdown(
     chat_id: str = Path(..., description="The unique ID of the chat session")
@@ -226,10 +423,10 @@ def get_prd_markdown(
     """
     Retrieves the latest full PRD markdown stored for the chat session.
     """
-    logger.info(f"Retrieving PRD for chat {chat_id}")
+    logger.info("Retrieving PRD for chat %s", chat_id)
     session_data = storage.get_chat_session(chat_id)
     if not session_data:
-        logger.warning(f"Chat not found when retrieving PRD: {chat_id}")
+        logger.warning("Chat not found when retrieving PRD: %s", chat_id)
         raise HTTPException(status_code=404, detail="Chat session not found")
 
     # Retrieve the dedicated field
@@ -238,36 +435,125 @@ def get_prd_markdown(
     # No need to strip preamble here, as storage should contain clean PRD
     if not latest_markdown:
         # If it's somehow empty/missing after creation, return the initial template as fallback
-        logger.warning(f"LatestPrdMarkdown field empty/missing for chat {chat_id}, returning initial template.")
+        logger.warning("LatestPrdMarkdown field empty/missing for chat %s, returning initial template.", chat_id)
         latest_markdown = INITIAL_PRD_MARKDOWN
 
-    logger.info(f"Successfully retrieved PRD for chat {chat_id}. Length: {len(latest_markdown)}")
-    return PrdContent(markdown=latest_markdown)
+    logger.info("Successfully retrieved PRD for chat %s. Length: %s", chat_id, len(latest_markdown))
+    return PrdContent(markdown=latest_markdown, pending=storage.is_prd_update_pending(session_data))
+
+@app.get("/api/chats/{chat_id}/prd/status", response_model=PrdStatus)
+def get_prd_status(
+    chat_id: str = Path(..., description="The unique ID of the chat session")
+):
+    """
+    Reports how complete the latest PRD is, per section and overall.
+    Computed locally from the stored markdown; no model call is made.
+    """
+    session_data = storage.get_chat_session(chat_id)
+    if not session_data:
+        logger.warning("Chat not found when retrieving PRD status: %s", chat_id)
+        raise HTTPException(status_code=404, detail="Chat session not found")
+
+    latest_markdown = session_data.get('LatestPrdMarkdown') or INITIAL_PRD_MARKDOWN
+    return PrdStatus(**prd_status.analyze_prd(latest_markdown, session_data.get('LatestPrdSections')))
 
 @app.delete("/api/chats/{chat_id}", status_code=204)
 def delete_chat(
     chat_id: str = Path(..., description="The unique ID of the chat session to delete")
 ):
     """Deletes a specific chat session."""
-    logger.info(f"Attempting to delete chat {chat_id}")
+    logger.info("Attempting to delete chat %s", chat_id)
     success = storage.delete_chat_session(chat_id)
     if not success:
         # Don't raise 404 if storage.delete_chat_session returns True for not found
         # Only raise 500 if the deletion actually failed due to an unexpected error
-        logger.error(f"Failed to delete chat session {chat_id} due to storage error.")
+        logger.error("Failed to delete chat session %s due to storage error.", chat_id)
         raise HTTPException(status_code=500, detail="Failed to delete chat session in storage")
-    logger.info(f"Successfully deleted chat {chat_id} (or it was already gone).")
+    logger.info("Successfully deleted chat %s (or it was already gone).", chat_id)
     return # Return 204 No Content on success
 
+@app.post("/api/prds/batch", response_model=BatchStatus, status_code=202)
+def create_prd_batch(request_body: BatchRequest = Body(...)):
+    """
+    Queues a first-draft PRD for every brief in the request.
+    Each brief becomes a normal chat session; poll the batch status for progress.
+    """
+    logger.info("Received PRD batch with %s briefs", len(request_body.briefs))
+    status = batch.submit_batch([brief.model_dump() for brief in request_body.briefs])
+    if not status:
+        logger.error("Failed to store PRD batch status.")
+        raise HTTPException(status_code=500, detail="Failed to save batch to storage")
+    return BatchStatus(**status)
+
+@app.get("/api/prds/batch/{batch_id}", response_model=BatchStatus)
+def get_prd_batch(batch_id: str = Path(..., description="The unique ID of the batch")):
+    """Returns progress and per-item status for a PRD batch."""
+    status = batch.get_batch_status(batch_id)
+    if not status:
+        logger.warning("Batch not found: %s", batch_id)
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return BatchStatus(**status)
+
+@app.get("/api/exports")
+def export_prds(
+    format: str = Query("ndjson", description="Export format: 'ndjson', or 'markdown'/'html' for a zip of per-chat documents"),
+    since: Optional[datetime] = Query(None, description="Only include chats modified at or after this time (ISO 8601)"),
+    until: Optional[datetime] = Query(None, description="Only include chats modified before this time (ISO 8601)"),
+    name: Optional[str] = Query(None, description="Only include chats whose name contains this text (case-insensitive)"),
+):
+    """
+    Streams a bulk export of all matching PRD chat sessions.
+    Storage is paged with prefetching, so memory use does not grow with the corpus size.
+    """
+    if format not in export.EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported export format '{format}'. Use one of: {', '.join(export.EXPORT_FORMATS)}")
+    # Mixed naive/aware values cannot be compared; naive ones are taken as UTC
+    since = storage.as_utc(since) if since else None
+    until = storage.as_utc(until) if until else None
+    if since and until and since >= until:
+        raise HTTPException(status_code=400, detail="'since' must be earlier than 'until'")
+
+    logger.info("Starting %s export (since=%s, until=%s, name=%r)", format, since, until, name)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    if format == "ndjson":
+        return StreamingResponse(
+            export.iter_ndjson_export(since=since, until=until, name_contains=name),
+            media_type="application/x-ndjson",
+            headers={"Content-Disposition": f'attachment; filename="prd-export-{stamp}.ndjson"'},
+        )
+    return StreamingResponse(
+        export.iter_zip_export(format, since=since, until=until, name_contains=name),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="prd-export-{format}-{stamp}.zip"'},
+    )
+
+@app.get("/api/metrics")
+def get_metrics():
+    """Returns this worker's in-process counters and gauges."""
+    return metrics.snapshot()
+
+# --- Health Endpoints ---
+
+@app.get("/healthz")
+def liveness():
+    """Liveness probe: the worker process is up and serving requests. Does not touch dependencies."""
+    return {"status": "ok", "uptime_seconds": round(time.time() - health.STARTED_AT, 1)}
+
+@app.get("/readyz")
+def readiness():
+    """
+    Readiness probe: reports each dependency's status and latency.
+    Returns 503 until Table Storage and Azure OpenAI are both reachable.
+    """
+    result = health.get_readiness()
+    return JSONResponse(status_code=200 if result["ready"] else 503, content=result)
+
 # --- Uvicorn Runner (for local development) ---
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8000)) # Use PORT env var if available (common in deployment)
-    logger.info(f"Starting Uvicorn server on port {port}")
-    # Check if storage and OpenAI clients are initialized before starting
-    if not storage.table_client:
-        logger.critical("Azure Table Storage client failed to initialize. Cannot start server. Check connection string and table name.")
-    # You might want a similar check for the azure_client in prd.py if it's critical
-    # elif not prd.azure_client: 
-    #     logger.critical("Azure OpenAI client failed to initialize. Cannot start server. Check credentials and endpoint.")
+    logger.info("Starting Uvicorn server on port %s", port)
+    # Clients are created lazily during startup warm-up; check /readyz for dependency status
+    if not storage.AZURE_STORAGE_CONNECTION_STRING:
+        logger.critical("AZURE_STORAGE_CONNECTION_STRING is not set. Cannot start server.")
     else:
          uvicorn.run("main:app", host="0.0.0.0", port=port, reload=True)
@@ -0,0 +1,25 @@
+import threading
+from collections import defaultdict
+
+# Simple in-process metrics registry. Values are per worker process.
+_lock = threading.Lock()
+_counters = defaultdict(int)
+_gauges = {}
+
+
+def increment(name: str, value: int = 1):
+    """Adds `value` to the named counter."""
+    with _lock:
+        _counters[name] += value
+
+
+def set_gauge(name: str, value: float):
+    """Sets the named gauge to its current value."""
+    with _lock:
+        _gauges[name] = value
+
+
+def snapshot() -> dict:
+    """Returns a copy of all counters and gauges."""
+    with _lock:
+        return {"counters": dict(_counters), "gauges": dict(_gauges)}
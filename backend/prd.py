@@ -1,10 +1,16 @@
 import os
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from openai import AzureOpenAI
 from dotenv import load_dotenv
 
+import metrics
+from incremental_json import IncrementalJsonParser
+from log_config import setup_logging, Payload
+
 # Configure logging
-logging.basicConfig(level=logging.INFO)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 # Load environment variables from .env file
@@ -16,23 +22,51 @@ AZURE_OPENAI_API_KEY = os.getenv("AZURE_OPENAI_API_KEY")
 # Check the documentation for the latest supported version
 AZURE_OPENAI_API_VERSION = "2025-03-01-preview" 
 AZURE_OPENAI_DEPLOYMENT_NAME = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME") # Your model deployment name (e.g., gpt-4o)
+# Opt-in: ask the model for JSON-schema structured output instead of delimiter-separated text
+STRUCTURED_OUTPUT_ENABLED = os.getenv("PRD_STRUCTURED_OUTPUT", "false").lower() in ("1", "true", "yes")
+
+_azure_client = None
+_azure_client_lock = threading.Lock()
+
 
-if not all([AZURE_OPENAI_ENDPOINT, AZURE_OPENAI_API_KEY, AZURE_OPENAI_DEPLOYMENT_NAME]):
-    logger.error("Missing one or more Azure OpenAI environment variables (ENDPOINT, API_KEY, DEPLOYMENT_NAME)")
-    # In a real app, you might raise an exception or handle this more gracefully
-    # For now, we allow it to proceed but client creation will likely fail
-    azure_client = None
-else:
+def get_azure_client() -> AzureOpenAI | None:
+    """
+    Returns the process-wide Azure OpenAI client, creating it on first use.
+    The client owns the HTTP connection pool, so every call in this worker reuses it.
+    A failed attempt is not cached, so the next call retries.
+    """
+    global _azure_client
+    if _azure_client:
+        return _azure_client
+    if not all([AZURE_OPENAI_ENDPOINT, AZURE_OPENAI_API_KEY, AZURE_OPENAI_DEPLOYMENT_NAME]):
+        logger.error("Missing one or more Azure OpenAI environment variables (ENDPOINT, API_KEY, DEPLOYMENT_NAME)")
+        return None
+
+    with _azure_client_lock:
+        if not _azure_client:
+            try:
+                _azure_client = AzureOpenAI(
+                    api_version=AZURE_OPENAI_API_VERSION,
+                    azure_endpoint=AZURE_OPENAI_ENDPOINT,
+                    api_key=AZURE_OPENAI_API_KEY,
+                )
+                logger.info("Azure OpenAI client initialized successfully.")
+            except Exception as e:
+                logger.error("Failed to initialize Azure OpenAI client: %s", e)
+                return None
+    return _azure_client
+
+
+def check_health() -> str | None:
+    """Makes a lightweight authenticated request (opening the connection pool). Returns an error message, or None if healthy."""
+    azure_client = get_azure_client()
+    if not azure_client:
+        return "Azure OpenAI client is not initialized."
     try:
-        azure_client = AzureOpenAI(
-            api_version=AZURE_OPENAI_API_VERSION,
-            azure_endpoint=AZURE_OPENAI_ENDPOINT,
-            api_key=AZURE_OPENAI_API_KEY,
-        )
-        logger.info("Azure OpenAI client initialized successfully.")
+        azure_client.with_options(timeout=10.0, max_retries=0).models.list()
+        return None
     except Exception as e:
-        logger.error(f"Failed to initialize Azure OpenAI client: {e}")
-        azure_client = None
+        return f"Azure OpenAI request failed: {e}"
 
 # --- Base PRD Template ---
 # This is the structure the AI will be working with.
@@ -200,6 +234,254 @@ Start the conversation. Remember to always output the full PRD markdown.
 # The first *full output* expected from the AI after the system prompt call
 INITIAL_ASSISTANT_FULL_OUTPUT = f"{INITIAL_ASSISTANT_MESSAGE_CONVO}\n{DELIMITER}\n{INITIAL_PRD_MARKDOWN}"
 
+# --- Structured Output (opt-in) ---
+# Each template placeholder becomes one string field, so the PRD can be rendered
+# (and stored per section) without scraping markdown out of free text.
+PRD_TURN_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "message": {
+            "type": "string",
+            "description": "Concise conversational message to the user: acknowledge their input and ask the next relevant question.",
+        },
+        "prd_sections": {
+            "type": "object",
+            "properties": {
+                field: {"type": "string", "description": f"Initial placeholder: {placeholder}"}
+                for field, placeholder in INITIAL_PLACEHOLDERS.items()
+            },
+            "required": list(INITIAL_PLACEHOLDERS),
+            "additionalProperties": False,
+        },
+    },
+    "required": ["message", "prd_sections"],
+    "additionalProperties": False,
+}
+
+STRUCTURED_OUTPUT_INSTRUCTIONS = f"""{SYSTEM_PROMPT_PRD}
+
+**Output Format Override:**
+Ignore the delimiter format described above. Respond ONLY with a JSON object matching the provided schema:
+*   `message`: the conversational part of your reply.
+*   `prd_sections`: the value of EVERY template placeholder, updated with all information gathered so far. Keep the initial placeholder text for anything still unknown, and keep list fields formatted as Markdown bullet lines exactly as they will appear in the document.
+"""
+
+def render_prd_markdown(prd_sections: dict) -> str:
+    """Renders PRD markdown from per-section values, falling back to the placeholder for missing sections."""
+    values = {**INITIAL_PLACEHOLDERS, **{k: v for k, v in prd_sections.items() if k in INITIAL_PLACEHOLDERS}}
+    return PRD_TEMPLATE.format(**values)
+
+# --- Split-Model Pipeline (opt-in) ---
+# 'single' keeps one large-model call per turn. 'parallel' and 'deferred' get the reply
+# from a fast deployment and rewrite the PRD in the background on a (possibly larger)
+# deployment: 'parallel' starts the rewrite alongside the reply, 'deferred' after it.
+PIPELINE_MODES = ("single", "parallel", "deferred")
+PRD_PIPELINE_MODE = os.getenv("PRD_PIPELINE_MODE", "single").lower()
+if PRD_PIPELINE_MODE not in PIPELINE_MODES:
+    logger.error("Unknown PRD_PIPELINE_MODE '%s'. Falling back to 'single'.", PRD_PIPELINE_MODE)
+    PRD_PIPELINE_MODE = "single"
+AZURE_OPENAI_REPLY_DEPLOYMENT_NAME = os.getenv("AZURE_OPENAI_REPLY_DEPLOYMENT_NAME") or AZURE_OPENAI_DEPLOYMENT_NAME
+AZURE_OPENAI_PRD_DEPLOYMENT_NAME = os.getenv("AZURE_OPENAI_PRD_DEPLOYMENT_NAME") or AZURE_OPENAI_DEPLOYMENT_NAME
+REPLY_HISTORY_MESSAGES = int(os.getenv("PRD_REPLY_HISTORY_MESSAGES", "12")) # Recent messages sent to the reply model
+REPLY_MAX_OUTPUT_TOKENS = int(os.getenv("PRD_REPLY_MAX_OUTPUT_TOKENS", "400"))
+PRD_REWRITE_WORKERS = int(os.getenv("PRD_REWRITE_WORKERS", "4"))
+PRD_REWRITE_MAX_CONFLICTS = 3 # Times a rewrite is redone because another worker changed the PRD first
+PRD_REWRITE_CONFIRM_TIMEOUT = float(os.getenv("PRD_REWRITE_CONFIRM_TIMEOUT", "120")) # Seconds a finished rewrite waits to learn whether its turn was saved
+
+REPLY_SYSTEM_PROMPT = """You are an expert Product Manager AI assistant for 8090 Solutions, collaboratively building a Product Requirements Document (PRD) with the user.
+The current PRD draft and the recent conversation are provided. The PRD itself is updated separately.
+Reply with ONLY a concise conversational message: acknowledge the user's latest input and ask the single most useful next question about information still missing from the PRD. Never output the PRD document."""
+
+PRD_REWRITE_SYSTEM_PROMPT = f"""You maintain a Product Requirements Document (PRD) for 8090 Solutions in Markdown.
+You are given the current PRD and the user's latest message(s). Output ONLY the COMPLETE updated PRD Markdown: incorporate any new information into the correct sections and leave everything else unchanged. No commentary, no code fences.
+
+**PRD Template Structure:**
+{PRD_TEMPLATE}"""
+
+# Short acknowledgements that never carry PRD content
+_SMALL_TALK = {
+    "ok", "okay", "k", "thanks", "thank you", "thx", "cool", "great", "nice", "sure",
+    "hi", "hello", "hey", "got it", "sounds good", "continue", "go on", "next",
+}
+
+_rewrite_executor = ThreadPoolExecutor(max_workers=max(PRD_REWRITE_WORKERS, 1), thread_name_prefix="prd-rewrite")
+_pending_rewrites = {} # Per-chat (user message, confirmation, turn) entries waiting for a rewrite; a key is present while its rewrite is queued or running
+_pending_rewrites_lock = threading.Lock()
+
+
+def _extract_assistant_text(response) -> str | None:
+    """Returns the first assistant output_text in a Responses API response."""
+    for output_item in response.output or []:
+        if output_item.type == "message" and output_item.role == "assistant" and output_item.content:
+            for content_item in output_item.content:
+                if content_item.type == "output_text":
+                    return content_item.text
+    return None
+
+
+def _get_output_text(model: str | None, input_data: list, **kwargs) -> tuple[str | None, str | None, str | None]:
+    """Runs a stateless Responses API call and returns (text, response_id, error)."""
+    azure_client = get_azure_client()
+    if not azure_client:
+        return None, None, "Azure OpenAI client is not initialized."
+    if not model:
+        return None, None, "Azure OpenAI deployment name is not configured."
+    try:
+        response = azure_client.responses.create(model=model, input=input_data, **kwargs)
+        if response.status == "completed":
+            text = _extract_assistant_text(response)
+            if text:
+                return text.strip(), response.id, None
+            return None, response.id, "Response completed but no assistant text output found."
+        reason = response.error.message if response.error else response.status
+        return None, response.id, f"Responses API call did not complete: {reason}"
+    except Exception as e:
+        logger.exception("Error calling Azure OpenAI Responses API with deployment %s", model)
+        return None, None, f"Error calling Azure OpenAI Responses API: {e}"
+
+
+def message_has_prd_information(content: str) -> bool:
+    """
+    Cheap local check for whether a user message could change the PRD.
+    Acknowledgements and short questions to the assistant skip the PRD rewrite entirely.
+    """
+    text = content.strip()
+    normalized = text.lower().rstrip("!.? ")
+    if not normalized or normalized in _SMALL_TALK:
+        return False
+    if text.endswith("?") and len(normalized.split()) <= 12:
+        return False
+    return True
+
+
+def get_conversational_reply(messages: list, current_prd_markdown: str) -> tuple[str | None, str | None]:
+    """
+    Gets only the conversational reply from the fast reply deployment.
+    `messages` is the stored history, ending with the new user message.
+
+    Returns:
+        A tuple containing:
+        - Conversational reply (str or None if error).
+        - An error message (str or None if success).
+    """
+    history = [msg for msg in messages if msg.get("role") in ("user", "assistant")][-REPLY_HISTORY_MESSAGES:]
+    api_input = [
+        {"type": "message", "role": "system", "content": REPLY_SYSTEM_PROMPT},
+        {"type": "message", "role": "system", "content": f"Current PRD draft:\n{current_prd_markdown}"},
+    ] + [{"type": "message", "role": msg["role"], "content": msg["content"]} for msg in history]
+
+    logger.info("Requesting conversational reply from deployment %s", AZURE_OPENAI_REPLY_DEPLOYMENT_NAME)
+    reply, _, error = _get_output_text(AZURE_OPENAI_REPLY_DEPLOYMENT_NAME, api_input, max_output_tokens=REPLY_MAX_OUTPUT_TOKENS)
+    if reply and DELIMITER in reply:
+        # The reply model occasionally copies the single-call format; keep only the message.
+        reply = reply.split(DELIMITER, 1)[0].strip()
+    return reply, error
+
+
+def get_prd_rewrite(current_prd_markdown: str, user_messages: list[str]) -> tuple[str | None, str | None]:
+    """
+    Rewrites the full PRD with the information in `user_messages` on the PRD deployment.
+
+    Returns:
+        A tuple containing:
+        - Updated PRD markdown (str or None if error).
+        - An error message (str or None if success).
+    """
+    new_information = "\n\n".join(user_messages)
+    api_input = [
+        {"type": "message", "role": "system", "content": PRD_REWRITE_SYSTEM_PROMPT},
+        {"type": "message", "role": "user", "content": f"Current PRD:\n{current_prd_markdown}\n\nLatest user message(s):\n{new_information}"},
+    ]
+    logger.info("Requesting PRD rewrite from deployment %s for %s message(s)", AZURE_OPENAI_PRD_DEPLOYMENT_NAME, len(user_messages))
+    markdown, _, error = _get_output_text(AZURE_OPENAI_PRD_DEPLOYMENT_NAME, api_input)
+    if markdown and DELIMITER in markdown:
+        markdown = markdown.split(DELIMITER, 1)[1].strip()
+    return markdown, error
+
+
+def _is_confirmed(confirmation) -> bool:
+    """True if the turn behind a queued message was saved (a message without a confirmation always counts)."""
+    if confirmation is None:
+        return True
+    try:
+        return bool(confirmation.result(timeout=PRD_REWRITE_CONFIRM_TIMEOUT))
+    except Exception:
+        return False
+
+
+def _run_prd_rewrites(key: str, load_current_prd, on_complete):
+    """Drains queued messages for one chat, folding everything that arrived meanwhile into the next rewrite."""
+    conflicts = 0
+    while True:
+        with _pending_rewrites_lock:
+            pending = _pending_rewrites[key]
+            if not pending:
+                del _pending_rewrites[key]
+                return
+            _pending_rewrites[key] = []
+        try:
+            current_prd_markdown = load_current_prd()
+            if current_prd_markdown is None:
+                logger.warning("Skipping PRD rewrite for %s: current PRD could not be loaded.", key)
+                metrics.increment("pipeline.rewrite_failures")
+                continue
+            markdown, error = get_prd_rewrite(current_prd_markdown, [user_message for user_message, _, _ in pending])
+            confirmed = [entry for entry in pending if _is_confirmed(entry[1])]
+            turn = max((entry[2] for entry in confirmed if entry[2] is not None), default=None)
+            if len(confirmed) < len(pending):
+                # A turn failed while its rewrite ran; its message must not reach the PRD, so redo the rest.
+                logger.info("Discarding PRD rewrite for %s: %s of its turns were not saved.", key, len(pending) - len(confirmed))
+                metrics.increment("pipeline.rewrites_discarded")
+                with _pending_rewrites_lock:
+                    _pending_rewrites[key][:0] = [(user_message, None, turn) for user_message, _, turn in confirmed]
+                continue
+            if error or not markdown:
+                logger.error("Background PRD rewrite failed for %s: %s", key, error)
+                metrics.increment("pipeline.rewrite_failures")
+                on_complete(None, turn)
+                continue
+            if on_complete(markdown, turn) is False:
+                # The PRD changed underneath this rewrite (another worker stored one first); redo it on the new PRD.
+                metrics.increment("pipeline.rewrite_conflicts")
+                conflicts += 1
+                if conflicts > PRD_REWRITE_MAX_CONFLICTS:
+                    logger.error("Giving up PRD rewrite for %s after %s conflicting updates.", key, conflicts - 1)
+                    metrics.increment("pipeline.rewrite_failures")
+                    conflicts = 0
+                    on_complete(None, turn)
+                    continue
+                with _pending_rewrites_lock:
+                    _pending_rewrites[key][:0] = [(user_message, None, turn) for user_message, _, turn in pending]
+                continue
+            conflicts = 0
+            metrics.increment("pipeline.rewrites_completed")
+        except Exception:
+            logger.exception("Unexpected error in background PRD rewrite for %s", key)
+            metrics.increment("pipeline.rewrite_failures")
+
+
+def schedule_prd_rewrite(key: str, user_message: str, load_current_prd, on_complete, confirmation=None, turn: int | None = None):
+    """
+    Queues a background PRD rewrite for one chat.
+    Rewrites for the same key run one at a time; messages that arrive while one is
+    running are coalesced into a single follow-up rewrite. `load_current_prd()` is
+    called right before each rewrite and `on_complete(markdown, turn)` receives the
+    result together with the highest `turn` it covers (markdown is None if the rewrite
+    failed or was given up, so the caller can still mark those turns as handled);
+    if it returns False, the stored PRD changed since it was loaded and the rewrite is
+    redone on the new PRD (up to PRD_REWRITE_MAX_CONFLICTS times).
+    Pass a `confirmation` Future to start the rewrite before the turn is saved: its
+    result (True once saved, False if the turn failed) is awaited before the rewrite
+    is stored, and a failed turn's message is dropped.
+    """
+    with _pending_rewrites_lock:
+        if key in _pending_rewrites:
+            _pending_rewrites[key].append((user_message, confirmation, turn))
+            metrics.increment("pipeline.rewrites_coalesced")
+            return
+        _pending_rewrites[key] = [(user_message, confirmation, turn)]
+    _rewrite_executor.submit(_run_prd_rewrites, key, load_current_prd, on_complete)
+
 # --- PRD Generation Logic ---
 
 def get_prd_update(input_data: list, previous_response_id: str | None = None) -> tuple[str | None, str | None, str | None, str | None]:
@@ -214,6 +496,7 @@ def get_prd_update(input_data: list, previous_response_id: str | None = None) ->
         - The ID of the new response (str or None if error).
         - An error message (str or None if success).
     """
+    azure_client = get_azure_client()
     if not azure_client:
         error_msg = "Azure OpenAI client is not initialized."
         logger.error(error_msg)
@@ -225,27 +508,19 @@ def get_prd_update(input_data: list, previous_response_id: str | None = None) ->
         return None, None, None, error_msg
 
     try:
-        logger.info(f"Sending request to Responses API. Previous ID: {previous_response_id}. Input: {input_data}")
+        logger.info("Sending request to Responses API. Previous ID: %s. Input: %s", previous_response_id, Payload(input_data))
         response = azure_client.responses.create(
             model=AZURE_OPENAI_DEPLOYMENT_NAME,
             input=input_data,
             previous_response_id=previous_response_id,
         )
-        logger.info(f"Received response from API. Response ID: {response.id}, Status: {response.status}")
+        logger.info("Received response from API. Response ID: %s, Status: %s", response.id, response.status)
 
         if response.status == "completed" and response.output:
-            raw_assistant_content = None
-            for output_item in response.output:
-                if output_item.type == "message" and output_item.role == "assistant" and output_item.content:
-                    for content_item in output_item.content:
-                        if content_item.type == "output_text":
-                            raw_assistant_content = content_item.text
-                            break
-                    if raw_assistant_content:
-                        break
+            raw_assistant_content = _extract_assistant_text(response)
 
             if raw_assistant_content:
-                logger.info(f"Extracted raw assistant content. Length: {len(raw_assistant_content)}")
+                logger.info("Extracted raw assistant content. Length: %s", len(raw_assistant_content))
                 if DELIMITER in raw_assistant_content:
                     parts = raw_assistant_content.split(DELIMITER, 1)
                     conversational_part = parts[0].strip()
@@ -253,7 +528,7 @@ def get_prd_update(input_data: list, previous_response_id: str | None = None) ->
                     logger.info("Successfully parsed response into conversation and PRD parts.")
                     return conversational_part, prd_markdown_part, response.id, None
                 else:
-                    logger.warning(f"Delimiter '{DELIMITER}' not found in response. Treating entire output as conversational.")
+                    logger.warning("Delimiter '%s' not found in response. Treating entire output as conversational.", DELIMITER)
                     return raw_assistant_content.strip(), None, response.id, None
             else:
                 error_msg = "Response completed but no assistant text output found."
@@ -273,3 +548,92 @@ def get_prd_update(input_data: list, previous_response_id: str | None = None) ->
         error_msg = f"Error calling Azure OpenAI Responses API: {e}"
         logger.exception(error_msg)
         return None, None, None, error_msg
+
+
+def get_structured_prd_update(input_data: list, previous_response_id: str | None = None) -> tuple[str | None, dict | None, str | None, str | None]:
+    """
+    Structured-output variant of get_prd_update.
+    Streams a JSON-schema response and parses it incrementally, so each field is
+    taken as soon as it is complete. If the stream is cut off, fails, or turns
+    malformed after the message field, the message is still returned so the turn
+    is not wasted; the PRD is then left unchanged. Parse failures are counted in metrics.
+
+    Returns:
+        A tuple containing:
+        - Conversational message (str or None if error/not found).
+        - PRD sections keyed by template placeholder (dict or None if error/not found).
+        - The ID of the new response (str or None if error).
+        - An error message (str or None if success).
+    """
+    azure_client = get_azure_client()
+    if not azure_client:
+        error_msg = "Azure OpenAI client is not initialized."
+        logger.error(error_msg)
+        return None, None, None, error_msg
+
+    if not AZURE_OPENAI_DEPLOYMENT_NAME:
+        error_msg = "Azure OpenAI deployment name is not configured."
+        logger.error(error_msg)
+        return None, None, None, error_msg
+
+    metrics.increment("structured_output.requests")
+    parser = IncrementalJsonParser(max_depth=2)
+    message = None
+    prd_sections = None
+    response_id = None
+    try:
+        logger.info("Sending structured request to Responses API. Previous ID: %s. Input: %s", previous_response_id, Payload(input_data))
+        stream = azure_client.responses.create(
+            model=AZURE_OPENAI_DEPLOYMENT_NAME,
+            input=input_data,
+            instructions=STRUCTURED_OUTPUT_INSTRUCTIONS,
+            previous_response_id=previous_response_id,
+            text={"format": {"type": "json_schema", "name": "prd_turn", "schema": PRD_TURN_SCHEMA, "strict": True}},
+            stream=True,
+        )
+        parse_error = None
+        for event in stream:
+            if event.type == "response.created":
+                response_id = event.response.id
+            elif event.type == "response.output_text.delta":
+                if parse_error:
+                    continue
+                try:
+                    fields = parser.feed(event.delta)
+                except ValueError as e:
+                    parse_error = str(e)
+                    continue
+                for path, value in fields:
+                    if path == ("message",):
+                        message = value
+                    elif path == ("prd_sections",):
+                        prd_sections = value
+            elif event.type in ("response.completed", "response.incomplete", "response.failed"):
+                response_id = event.response.id
+                if event.type != "response.completed":
+                    reason = event.response.error.message if event.response.error else event.response.incomplete_details
+                    parse_error = parse_error or f"Response ended with status '{event.response.status}': {reason}"
+            elif event.type == "error":
+                parse_error = parse_error or f"Responses API error: {event.message}"
+
+        if not parse_error and not parser.done:
+            parse_error = "Structured output ended before the JSON document was complete."
+        logger.info("Received structured response from API. Response ID: %s", response_id)
+
+        if parse_error or message is None or prd_sections is None:
+            metrics.increment("structured_output.parse_failures")
+            logger.warning("Structured output parse failure for response %s: %s", response_id, parse_error or 'missing fields')
+            if message is None:
+                return None, None, response_id, parse_error or "Structured output did not contain a message."
+            # The reply survived, so keep the turn and leave the stored PRD unchanged.
+            metrics.increment("structured_output.partial_recoveries")
+            return message.strip(), None, response_id, None
+
+        return message.strip(), prd_sections, response_id, None
+
+    except Exception as e:
+        metrics.increment("structured_output.request_errors")
+        error_msg = f"Error calling Azure OpenAI Responses API: {e}"
+        logger.exception(error_msg)
+        return None, None, response_id, error_msg
+
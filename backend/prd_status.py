@@ -0,0 +1,148 @@
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+
+from prd import PRD_TEMPLATE, INITIAL_PLACEHOLDERS
+
+STATUS_CACHE_SIZE = 512 # Analyses kept per process, keyed by PRD content hash
+HEADER_SECTION = "Header" # Name used for the title/version block above the first '##' heading
+
+_FIELD_PATTERN = re.compile(r"\{(\w+)\}")
+
+
+def _normalize(line: str) -> str:
+    """Collapses whitespace so indentation/bullet spacing changes by the model do not matter."""
+    return " ".join(line.split())
+
+
+def _split_sections(markdown: str) -> "OrderedDict[str, list[str]]":
+    """Splits markdown into '## ' sections (plus the header block), keeping each section's lines."""
+    sections = OrderedDict([(HEADER_SECTION, [])])
+    current = HEADER_SECTION
+    for line in markdown.splitlines():
+        if line.startswith("## "):
+            current = line[3:].strip()
+            sections.setdefault(current, [])
+        else:
+            sections[current].append(line)
+    return sections
+
+
+def _build_field_specs() -> list[dict]:
+    """
+    Derives, once, how to recognize each template field still holding its initial placeholder.
+    Fields that occupy a whole template line are matched line by line; inline fields are
+    matched by their label plus placeholder (e.g. 'Date: [Date]'), so shared placeholder
+    text such as '[Target Date]' is attributed to the right field.
+    """
+    specs = []
+    for section, lines in _split_sections(PRD_TEMPLATE).items():
+        for line in lines:
+            for match in _FIELD_PATTERN.finditer(line):
+                field = match.group(1)
+                placeholder = INITIAL_PLACEHOLDERS[field]
+                if line.strip() == match.group(0):
+                    markers = [_normalize(value_line) for value_line in placeholder.splitlines() if value_line.strip()]
+                    mode = "line"
+                else:
+                    prefix = line[:match.start()]
+                    prefix = re.split(r"[}|]", prefix)[-1]
+                    markers = [_normalize(prefix + placeholder)]
+                    mode = "inline"
+                specs.append({"field": field, "section": section, "mode": mode, "markers": markers})
+    return specs
+
+
+_FIELD_SPECS = _build_field_specs()
+_SECTION_ORDER = list(OrderedDict.fromkeys(spec["section"] for spec in _FIELD_SPECS))
+
+_cache: "OrderedDict[tuple, dict]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _is_placeholder(spec: dict, lines: list[str], text: str) -> bool:
+    if spec["mode"] == "line":
+        return any(marker in lines for marker in spec["markers"])
+    return any(marker in text for marker in spec["markers"])
+
+
+def _is_unfilled(field: str, value) -> bool:
+    return not isinstance(value, str) or not value.strip() or _normalize(value) == _normalize(INITIAL_PLACEHOLDERS[field])
+
+
+def _analyze(markdown: str, prd_sections: dict | None) -> dict:
+    sections = {name: [_normalize(line) for line in lines] for name, lines in _split_sections(markdown).items()}
+    all_lines = [line for lines in sections.values() for line in lines]
+    texts = {name: "\n".join(lines) for name, lines in sections.items()}
+
+    results = OrderedDict(
+        (name, {"name": name, "present": name in sections, "filled_fields": [], "missing_fields": []})
+        for name in _SECTION_ORDER
+    )
+    for spec in _FIELD_SPECS:
+        if prd_sections is not None:
+            missing = _is_unfilled(spec["field"], prd_sections.get(spec["field"]))
+            results[spec["section"]]["missing_fields" if missing else "filled_fields"].append(spec["field"])
+            continue
+        # If the model renamed or dropped a heading, look for the placeholder anywhere in the document.
+        if spec["section"] in sections:
+            lines, text = sections[spec["section"]], texts[spec["section"]]
+        else:
+            lines, text = all_lines, "\n".join(all_lines)
+        bucket = "missing_fields" if _is_placeholder(spec, lines, text) else "filled_fields"
+        results[spec["section"]][bucket].append(spec["field"])
+
+    filled_total = 0
+    for result in results.values():
+        filled = len(result["filled_fields"])
+        total = filled + len(result["missing_fields"])
+        result["completeness"] = round(filled / total, 3) if total else 1.0
+        filled_total += filled
+
+    return {
+        "completeness": round(filled_total / len(_FIELD_SPECS), 3),
+        "filled_fields": filled_total,
+        "total_fields": len(_FIELD_SPECS),
+        "sections": list(results.values()),
+    }
+
+
+def analyze_prd(markdown: str, prd_sections: dict | None = None) -> dict:
+    """
+    Computes per-section and overall completeness of a PRD without calling the model.
+    A field counts as missing while it still contains its INITIAL_PLACEHOLDERS text.
+    When the per-section values stored with the PRD (structured-output mode) are given,
+    fields are checked directly against them instead of being located in the markdown.
+    Results are cached by content hash.
+    """
+    content_hash = hashlib.sha256(markdown.encode("utf-8")).hexdigest()
+    cache_key = (content_hash, prd_sections is not None)
+    with _cache_lock:
+        cached = _cache.get(cache_key)
+        if cached is not None:
+            _cache.move_to_end(cache_key)
+            return cached
+
+    status = _analyze(markdown, prd_sections)
+    status["content_hash"] = content_hash
+    with _cache_lock:
+        _cache[cache_key] = status
+        while len(_cache) > STATUS_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return status
+
+
+def missing_sections_hint(status: dict) -> str | None:
+    """Builds a short note for the model naming the sections still missing information, or None if complete."""
+    parts = [
+        f"{section['name']} ({len(section['missing_fields'])} open)"
+        for section in status["sections"]
+        if section["missing_fields"]
+    ]
+    if not parts:
+        return None
+    return (
+        f"PRD status: {round(status['completeness'] * 100)}% complete. "
+        f"Sections still missing information: {', '.join(parts)}. Focus your next question on these."
+    )
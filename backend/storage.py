@@ -1,11 +1,19 @@
 import os
 import logging
 import json
+import queue
+import threading
+from datetime import datetime, timedelta, timezone
 from azure.data.tables import TableServiceClient, TableClient, UpdateMode
-from azure.core.exceptions import ResourceNotFoundError, ResourceExistsError
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceNotFoundError, ResourceExistsError, ResourceModifiedError
 from dotenv import load_dotenv
 
-logging.basicConfig(level=logging.INFO)
+import archive
+import metrics
+from log_config import setup_logging
+
+setup_logging()
 logger = logging.getLogger(__name__)
 
 load_dotenv()
@@ -13,29 +21,86 @@ load_dotenv()
 AZURE_STORAGE_CONNECTION_STRING = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
 TABLE_NAME = os.getenv("PRD_CHAT_TABLE_NAME", "prdchats") # Default to 'prdchats' if not set
 PARTITION_KEY = "PRDChatSession" # Use a fixed partition key for simplicity in POC
+SCAN_PAGE_SIZE = int(os.getenv("PRD_SCAN_PAGE_SIZE", "100")) # Entities fetched per page when scanning the table
+SCAN_PREFETCH_PAGES = int(os.getenv("PRD_SCAN_PREFETCH_PAGES", "2")) # Pages buffered ahead of the consumer
+BATCH_TABLE_NAME = os.getenv("PRD_BATCH_TABLE_NAME", "prdbatches") # Batch and per-item status rows, one partition per batch
+BATCH_HEADER_ROW = "batch" # RowKey of a batch's summary row; item rows use "item-<index>"
+BATCH_TRANSACTION_SIZE = 100 # Max operations per Table Storage transaction
+PRD_REQUESTED_TURN_FIELD = "PrdRequestedTurn" # Last turn queued for a background PRD rewrite
+PRD_APPLIED_TURN_FIELD = "PrdAppliedTurn" # Last turn the background rewrites have finished with (stored or given up)
+PRD_WRITE_ATTEMPTS = 5 # Conditional PRD writes retried while only other columns of the row change
+ARCHIVE_IDLE_DAYS = float(os.getenv("PRD_ARCHIVE_IDLE_DAYS", "30")) # Sessions untouched this long move to the archive
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("PRD_ARCHIVE_INTERVAL_SECONDS", "0")) # How often the tiering job runs, 0 disables it; requires PRD_ARCHIVE_DIR
 
-table_client = None
+# Columns of an archived session's stub row, besides its keys and Name.
+# Any other column on a stub was written after archiving and overrides the archived value.
+ARCHIVE_STUB_FIELDS = ["Archived", "ArchiveSegment", "ArchiveOffset", "ArchiveLength"]
+# Archived-record field holding the row's Timestamp before archiving (the stub's Timestamp is the archive time)
+ARCHIVE_LAST_MODIFIED_FIELD = "LastModified"
+
+_table_clients = {}
+_table_client_lock = threading.Lock()
+
+
+def _get_or_create_table_client(table_name: str) -> TableClient | None:
+    """
+    Returns the process-wide client for `table_name`, creating it (and the table, if missing) on first use.
+    Nothing is contacted at import time; the app's startup warm-up normally makes the first call.
+    A failed attempt is not cached, so the next call retries.
+    """
+    table_client = _table_clients.get(table_name)
+    if table_client:
+        return table_client
+    if not AZURE_STORAGE_CONNECTION_STRING:
+        logger.error("Azure Storage Connection String (AZURE_STORAGE_CONNECTION_STRING) is not set.")
+        return None
+
+    with _table_client_lock:
+        if table_name in _table_clients:
+            return _table_clients[table_name]
+        try:
+            table_service_client = TableServiceClient.from_connection_string(conn_str=AZURE_STORAGE_CONNECTION_STRING)
+            logger.info("Table Service Client created for table: %s", table_name)
+        except Exception as e:
+            logger.error("Failed to create TableServiceClient: %s", e)
+            return None
 
-if not AZURE_STORAGE_CONNECTION_STRING:
-    logger.error("Azure Storage Connection String (AZURE_STORAGE_CONNECTION_STRING) is not set.")
-else:
-    try:
-        table_service_client = TableServiceClient.from_connection_string(conn_str=AZURE_STORAGE_CONNECTION_STRING)
-        logger.info(f"Table Service Client created for table: {TABLE_NAME}")
-        
         # Create table if it doesn't exist
         try:
-            table_client = table_service_client.create_table(table_name=TABLE_NAME)
-            logger.info(f"Table '{TABLE_NAME}' created successfully.")
-        except ResourceExistsError:
-            logger.info(f"Table '{TABLE_NAME}' already exists. Getting client.")
-            table_client = table_service_client.get_table_client(table_name=TABLE_NAME)
+            _table_clients[table_name] = table_service_client.create_table_if_not_exists(table_name=table_name)
+            logger.info("Table '%s' is ready.", table_name)
         except Exception as e:
-            logger.error(f"Error during table creation/retrieval: {e}")
-            table_client = None # Ensure client is None if creation failed
+            logger.error("Error during table creation/retrieval: %s", e)
+            return None
+    return _table_clients[table_name]
+
+
+def get_table_client() -> TableClient | None:
+    """Returns the chat session table client (see _get_or_create_table_client)."""
+    return _get_or_create_table_client(TABLE_NAME)
+
+
+def get_batch_table_client() -> TableClient | None:
+    """Returns the batch status table client (see _get_or_create_table_client)."""
+    return _get_or_create_table_client(BATCH_TABLE_NAME)
+
 
+def check_health() -> str | None:
+    """Runs a minimal query against the table (also opening its connection pool). Returns an error message, or None if healthy."""
+    table_client = get_table_client()
+    if not table_client:
+        return "Table client not initialized."
+    try:
+        pages = table_client.query_entities(
+            query_filter="PartitionKey eq @pk",
+            parameters={"pk": PARTITION_KEY},
+            select=["RowKey"],
+            results_per_page=1,
+        ).by_page()
+        next(pages, None)
+        return None
     except Exception as e:
-        logger.error(f"Failed to create TableServiceClient: {e}")
+        return f"Table Storage query failed: {e}"
 
 
 def _serialize_messages(messages: list) -> str:
@@ -52,8 +117,42 @@ def _deserialize_messages(messages_json: str | None) -> list:
         logger.error("Failed to decode messages JSON from storage.")
         return [] # Return empty list on error
 
+def as_utc(value: datetime) -> datetime:
+    """Returns `value` as an aware UTC datetime; naive values are taken to be UTC already."""
+    return value.astimezone(timezone.utc) if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+def _deserialize_sections(sections_json: str | None) -> dict | None:
+    """Deserialize stored per-section PRD values, or None if there are none (delimiter-mode PRDs)."""
+    if not sections_json:
+        return None
+    try:
+        return json.loads(sections_json)
+    except json.JSONDecodeError:
+        logger.error("Failed to decode PRD sections JSON from storage.")
+        return None
+
+def _rehydrate(stub: dict) -> dict:
+    """
+    Rebuilds a full session from an archive stub: the archived record, overlaid with columns written since.
+    The session keeps the archived LastModified only if the stub has not been written to since archiving.
+    Raises archive.ArchiveUnavailableError if the archived record cannot be read.
+    """
+    try:
+        record = archive.read_session(stub["ArchiveSegment"], stub["ArchiveOffset"], stub["ArchiveLength"])
+    except Exception as e:
+        logger.error("Failed to read archived chat session %s: %s", stub.get("RowKey"), e)
+        raise archive.ArchiveUnavailableError(f"Archived chat session {stub.get('RowKey')} could not be read") from e
+    written_since = {key: value for key, value in stub.items() if key not in ARCHIVE_STUB_FIELDS and value is not None}
+    session = dict(record)
+    session.update(written_since)
+    renamed = "Name" in written_since and written_since["Name"] != (record.get("Name") or "")
+    if renamed or set(written_since) - {"PartitionKey", "RowKey", "Name"}:
+        session.pop(ARCHIVE_LAST_MODIFIED_FIELD, None) # The stub's own Timestamp is the last modification
+    return session
+
 def create_chat_session(chat_id: str, name: str, messages: list, last_response_id: str | None, initial_prd_markdown: str):
     """Creates a new chat session entity in Azure Table Storage."""
+    table_client = get_table_client()
     if not table_client:
         logger.error("Table client not initialized. Cannot create chat session.")
         return False
@@ -68,38 +167,49 @@ def create_chat_session(chat_id: str, name: str, messages: list, last_response_i
     }
     try:
         table_client.create_entity(entity=entity)
-        logger.info(f"Chat session created successfully: {chat_id}")
+        logger.info("Chat session created successfully: %s", chat_id)
         return True
     except ResourceExistsError:
-        logger.warning(f"Chat session with ID {chat_id} already exists.")
+        logger.warning("Chat session with ID %s already exists.", chat_id)
         return False # Or handle as needed
     except Exception as e:
-        logger.error(f"Failed to create chat session {chat_id}: {e}")
+        logger.error("Failed to create chat session %s: %s", chat_id, e)
         return False
 
 def get_chat_session(chat_id: str) -> dict | None:
-    """Retrieves a chat session entity from Azure Table Storage."""
+    """
+    Retrieves a chat session entity from Azure Table Storage.
+    Returns None if the session does not exist; raises archive.ArchiveUnavailableError if it
+    is archived and its record cannot be read, so callers do not mistake it for a missing chat.
+    """
+    table_client = get_table_client()
     if not table_client:
         logger.error("Table client not initialized. Cannot get chat session.")
         return None
     try:
         entity = table_client.get_entity(partition_key=PARTITION_KEY, row_key=chat_id)
+        if entity.get('Archived'):
+            entity = _rehydrate(entity)
         # Deserialize messages before returning
         entity['Messages'] = _deserialize_messages(entity.get('Messages'))
+        entity['LatestPrdSections'] = _deserialize_sections(entity.get('LatestPrdSections'))
         # Handle potentially empty LastResponseId
         if 'LastResponseId' in entity and not entity['LastResponseId']:
              entity['LastResponseId'] = None
-        logger.info(f"Retrieved chat session: {chat_id}")
+        logger.info("Retrieved chat session: %s", chat_id)
         return entity
     except ResourceNotFoundError:
-        logger.warning(f"Chat session not found: {chat_id}")
+        logger.warning("Chat session not found: %s", chat_id)
         return None
+    except archive.ArchiveUnavailableError:
+        raise
     except Exception as e:
-        logger.error(f"Failed to retrieve chat session {chat_id}: {e}")
+        logger.error("Failed to retrieve chat session %s: %s", chat_id, e)
         return None
 
 def list_chat_sessions() -> list[dict]:
     """Lists basic info (ID, Name) for all chat sessions."""
+    table_client = get_table_client()
     if not table_client:
         logger.error("Table client not initialized. Cannot list chat sessions.")
         return []
@@ -109,14 +219,187 @@ def list_chat_sessions() -> list[dict]:
             {"id": entity["RowKey"], "name": entity.get("Name", "Untitled Chat")}
             for entity in entities
         ]
-        logger.info(f"Listed {len(session_list)} chat sessions.")
+        logger.info("Listed %s chat sessions.", len(session_list))
         return session_list
     except Exception as e:
-        logger.error(f"Failed to list chat sessions: {e}")
+        logger.error("Failed to list chat sessions: %s", e)
         return []
 
-def update_chat_session(chat_id: str, messages: list, last_response_id: str | None, latest_prd_markdown: str | None):
-    """Updates messages, last ID, and latest PRD for a chat session."""
+def iter_chat_sessions(
+    select: list[str] | None = None,
+    modified_since: datetime | None = None,
+    modified_before: datetime | None = None,
+    page_size: int = SCAN_PAGE_SIZE,
+    prefetch_pages: int = SCAN_PREFETCH_PAGES,
+):
+    """
+    Yields chat session entities page by page without materializing the whole table.
+
+    A background thread fetches up to `prefetch_pages` pages ahead of the consumer,
+    so storage round trips overlap with whatever the caller does with each entity
+    while memory stays bounded to roughly (prefetch_pages + 1) * page_size entities.
+    Messages are deserialized when selected and archived sessions are rehydrated.
+    Each entity also carries a 'Timestamp' key with its last-modified time; for archived
+    sessions that is the time of the last change before archiving, not the archive time,
+    and the date filters apply to it.
+    """
+    table_client = get_table_client()
+    if not table_client:
+        logger.error("Table client not initialized. Cannot scan chat sessions.")
+        return
+
+    query_filter = "PartitionKey eq @pk"
+    parameters = {"pk": PARTITION_KEY}
+    if modified_since:
+        query_filter += " and Timestamp ge @since"
+        parameters["since"] = modified_since
+    if modified_before:
+        # A stub's Timestamp is its archive time, so stubs are checked against their real last modification below
+        query_filter += " and (Timestamp lt @before or Archived eq true)"
+        parameters["before"] = modified_before
+
+    pages = queue.Queue(maxsize=max(prefetch_pages, 1))
+    stop = threading.Event()
+    done = object()
+
+    def _put(item) -> bool:
+        # Block while the consumer is behind, but give up once it has gone away.
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce():
+        try:
+            paged = table_client.query_entities(
+                query_filter=query_filter,
+                parameters=parameters,
+                select=select + ARCHIVE_STUB_FIELDS if select else None,
+                results_per_page=page_size,
+            )
+            for page in paged.by_page():
+                if not _put(list(page)):
+                    return
+            _put(done)
+        except Exception as e:
+            _put(e)
+
+    producer = threading.Thread(target=_produce, name="chat-session-scan", daemon=True)
+    producer.start()
+    count = 0
+    try:
+        while True:
+            item = pages.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                logger.error("Failed to scan chat sessions after %s entities: %s", count, item)
+                raise item
+            for entity in item:
+                timestamp = entity.metadata.get("timestamp")
+                if entity.get("Archived"):
+                    # A read failure fails the scan; skipping would silently drop the session from backups
+                    entity = _rehydrate(entity)
+                    last_modified = entity.pop(ARCHIVE_LAST_MODIFIED_FIELD, None)
+                    if last_modified:
+                        timestamp = datetime.fromisoformat(last_modified)
+                    if timestamp and (
+                        (modified_since and as_utc(timestamp) < as_utc(modified_since))
+                        or (modified_before and as_utc(timestamp) >= as_utc(modified_before))
+                    ):
+                        continue
+                if "Messages" in entity:
+                    entity["Messages"] = _deserialize_messages(entity.get("Messages"))
+                entity["Timestamp"] = timestamp
+                count += 1
+                yield entity
+        logger.info("Scanned %s chat sessions.", count)
+    finally:
+        stop.set()
+
+def archive_idle_sessions(idle_days: float = ARCHIVE_IDLE_DAYS) -> int:
+    """
+    Moves sessions not modified for `idle_days` into the compressed archive, replacing each
+    row with a small stub (name plus archive location). Stubs that were written to after
+    archiving are re-archived with their newer columns. A row modified while it is being
+    archived keeps its full contents (the replace is conditional on its ETag).
+    Returns the number of sessions archived.
+    """
+    table_client = get_table_client()
+    if not table_client:
+        logger.error("Table client not initialized. Cannot archive chat sessions.")
+        return 0
+
+    with archive.tiering_job_lock() as acquired:
+        if not acquired:
+            logger.info("Tiering job already running elsewhere; skipping this run.")
+            return 0
+
+        cutoff = datetime.now(timezone.utc) - timedelta(days=idle_days)
+        archived = 0
+        try:
+            entities = table_client.query_entities(
+                query_filter="PartitionKey eq @pk and Timestamp lt @cutoff",
+                parameters={"pk": PARTITION_KEY, "cutoff": cutoff},
+                results_per_page=SCAN_PAGE_SIZE,
+            )
+            for entity in entities:
+                chat_id = entity["RowKey"]
+                fields = {key: value for key, value in entity.items() if key not in ("PartitionKey", "RowKey")}
+                if entity.get("Archived"):
+                    if not set(fields) - set(ARCHIVE_STUB_FIELDS) - {"Name"}:
+                        continue # Already a bare stub
+                    try:
+                        session = _rehydrate(entity)
+                    except archive.ArchiveUnavailableError:
+                        continue
+                    fields = {key: value for key, value in session.items() if key not in ("PartitionKey", "RowKey")}
+
+                fields[ARCHIVE_LAST_MODIFIED_FIELD] = entity.metadata["timestamp"].isoformat()
+                segment, offset, length = archive.append_session(chat_id, fields)
+                stub = {
+                    "PartitionKey": PARTITION_KEY,
+                    "RowKey": chat_id,
+                    "Name": fields.get("Name", ""),
+                    "Archived": True,
+                    "ArchiveSegment": segment,
+                    "ArchiveOffset": offset,
+                    "ArchiveLength": length,
+                }
+                try:
+                    table_client.update_entity(
+                        entity=stub,
+                        mode=UpdateMode.REPLACE,
+                        etag=entity.metadata["etag"],
+                        match_condition=MatchConditions.IfNotModified,
+                    )
+                    archived += 1
+                except (ResourceModifiedError, ResourceNotFoundError):
+                    # Touched or deleted since the scan; the appended record is simply never referenced.
+                    logger.info("Chat session %s changed during archiving; left in the hot table.", chat_id)
+        except Exception as e:
+            logger.error("Tiering job failed after archiving %s chat sessions: %s", archived, e)
+
+    metrics.increment("archive.sessions_archived", archived)
+    logger.info("Tiering job archived %s chat sessions idle for more than %s days.", archived, idle_days)
+    return archived
+
+def update_chat_session(
+    chat_id: str,
+    messages: list,
+    last_response_id: str | None,
+    latest_prd_markdown: str | None,
+    latest_prd_sections: dict | None = None,
+    prd_requested_turn: int | None = None,
+):
+    """
+    Updates messages, last ID, and latest PRD (and its per-section values, if known) for a chat session.
+    `prd_requested_turn` records a turn whose PRD update is still being written in the background.
+    """
+    table_client = get_table_client()
     if not table_client:
         logger.error("Table client not initialized. Cannot update chat session.")
         return False
@@ -130,21 +413,126 @@ def update_chat_session(chat_id: str, messages: list, last_response_id: str | No
     # Only update the PRD markdown if a new version was provided
     if latest_prd_markdown is not None:
          entity["LatestPrdMarkdown"] = latest_prd_markdown
+         # Per-section values are only kept while they match the stored markdown
+         entity["LatestPrdSections"] = json.dumps(latest_prd_sections) if latest_prd_sections is not None else ""
+    if prd_requested_turn is not None:
+        entity[PRD_REQUESTED_TURN_FIELD] = prd_requested_turn
 
     try:
         # Use MERGE to update only provided fields
         table_client.update_entity(entity=entity, mode=UpdateMode.MERGE)
-        logger.info(f"Chat session updated successfully: {chat_id}")
+        logger.info("Chat session updated successfully: %s", chat_id)
+        return True
+    except ResourceNotFoundError:
+        logger.warning("Chat session not found for update: %s", chat_id)
+        return False
+    except Exception as e:
+        logger.error("Failed to update chat session %s: %s", chat_id, e)
+        return False
+
+def get_prd_for_update(chat_id: str) -> tuple[str, str] | None:
+    """
+    Returns the stored PRD markdown (empty if unset) and the row's ETag, for a later
+    conditional update_prd_markdown. Returns None if the session is missing or unreadable.
+    """
+    table_client = get_table_client()
+    if not table_client:
+        logger.error("Table client not initialized. Cannot read PRD markdown.")
+        return None
+    try:
+        entity = table_client.get_entity(partition_key=PARTITION_KEY, row_key=chat_id)
+        etag = entity.metadata["etag"]
+        if entity.get('Archived'):
+            entity = _rehydrate(entity)
+        return entity.get('LatestPrdMarkdown') or "", etag
+    except ResourceNotFoundError:
+        logger.warning("Chat session not found when reading PRD markdown: %s", chat_id)
+        return None
+    except Exception as e:
+        logger.error("Failed to read PRD markdown for %s: %s", chat_id, e)
+        return None
+
+def update_prd_markdown(
+    chat_id: str,
+    latest_prd_markdown: str,
+    latest_prd_sections: dict | None = None,
+    etag: str | None = None,
+    base_markdown: str | None = None,
+    prd_applied_turn: int | None = None,
+) -> bool | None:
+    """
+    Updates only the latest PRD markdown (and its per-section values, if known), leaving messages and the response ID untouched.
+
+    With `etag` and `base_markdown` (from get_prd_for_update), the write is conditional on the row's ETag,
+    so concurrent writers on other workers cannot overwrite each other. If the row changed but its
+    PRD is still `base_markdown` (e.g. only messages were saved), the write is retried against the
+    new ETag. `prd_applied_turn` records the last turn this PRD covers. Returns True on success, False on failure, or None if the PRD itself was changed by
+    another writer, in which case the caller should reload it and redo its update.
+    """
+    table_client = get_table_client()
+    if not table_client:
+        logger.error("Table client not initialized. Cannot update PRD markdown.")
+        return False
+
+    entity = {
+        "PartitionKey": PARTITION_KEY,
+        "RowKey": chat_id,
+        "LatestPrdMarkdown": latest_prd_markdown,
+        "LatestPrdSections": json.dumps(latest_prd_sections) if latest_prd_sections is not None else ""
+    }
+    if prd_applied_turn is not None:
+        entity[PRD_APPLIED_TURN_FIELD] = prd_applied_turn
+    for _ in range(PRD_WRITE_ATTEMPTS):
+        try:
+            if etag:
+                table_client.update_entity(entity=entity, mode=UpdateMode.MERGE, etag=etag, match_condition=MatchConditions.IfNotModified)
+            else:
+                table_client.update_entity(entity=entity, mode=UpdateMode.MERGE)
+            logger.info("PRD markdown updated successfully: %s", chat_id)
+            return True
+        except ResourceModifiedError:
+            current = get_prd_for_update(chat_id)
+            if current is None:
+                return False
+            current_markdown, etag = current
+            if current_markdown != (base_markdown or ""):
+                logger.info("PRD for chat %s changed since it was read; not overwriting it.", chat_id)
+                return None
+        except ResourceNotFoundError:
+            logger.warning("Chat session not found for PRD update: %s", chat_id)
+            return False
+        except Exception as e:
+            logger.error("Failed to update PRD markdown for %s: %s", chat_id, e)
+            return False
+    logger.error("Gave up updating PRD markdown for %s after %s conflicting writes.", chat_id, PRD_WRITE_ATTEMPTS)
+    return False
+
+def mark_prd_turn_applied(chat_id: str, turn: int) -> bool:
+    """Records that background PRD work up to `turn` is finished without storing a new PRD (e.g. the rewrite failed)."""
+    table_client = get_table_client()
+    if not table_client:
+        logger.error("Table client not initialized. Cannot update PRD status.")
+        return False
+    entity = {"PartitionKey": PARTITION_KEY, "RowKey": chat_id, PRD_APPLIED_TURN_FIELD: turn}
+    try:
+        table_client.update_entity(entity=entity, mode=UpdateMode.MERGE)
         return True
     except ResourceNotFoundError:
-        logger.warning(f"Chat session not found for update: {chat_id}")
+        logger.warning("Chat session not found when updating PRD status: %s", chat_id)
         return False
     except Exception as e:
-        logger.error(f"Failed to update chat session {chat_id}: {e}")
+        logger.error("Failed to update PRD status for %s: %s", chat_id, e)
         return False
 
+def is_prd_update_pending(session_data: dict) -> bool:
+    """Whether a background PRD rewrite for this session has not finished yet."""
+    requested = session_data.get(PRD_REQUESTED_TURN_FIELD) or 0
+    applied = session_data.get(PRD_APPLIED_TURN_FIELD) or 0
+    return requested > applied
+
 def rename_chat_session(chat_id: str, new_name: str):
     """Updates the name of a chat session."""
+    table_client = get_table_client()
     if not table_client:
         logger.error("Table client not initialized. Cannot rename chat session.")
         return False
@@ -156,29 +544,121 @@ def rename_chat_session(chat_id: str, new_name: str):
     }
     try:
         table_client.update_entity(entity=entity, mode=UpdateMode.MERGE)
-        logger.info(f"Chat session renamed successfully: {chat_id} to '{new_name}'")
+        logger.info("Chat session renamed successfully: %s to '%s'", chat_id, new_name)
         return True
     except ResourceNotFoundError:
-        logger.warning(f"Chat session not found for rename: {chat_id}")
+        logger.warning("Chat session not found for rename: %s", chat_id)
         return False
     except Exception as e:
-        logger.error(f"Failed to rename chat session {chat_id}: {e}")
+        logger.error("Failed to rename chat session %s: %s", chat_id, e)
         return False
 
 # Optional: Add delete function if needed
 def delete_chat_session(chat_id: str) -> bool:
     """Deletes a chat session entity from Azure Table Storage."""
+    table_client = get_table_client()
     if not table_client:
         logger.error("Table client not initialized. Cannot delete chat session.")
         return False
     try:
         table_client.delete_entity(partition_key=PARTITION_KEY, row_key=chat_id)
-        logger.info(f"Chat session deleted successfully: {chat_id}")
+        logger.info("Chat session deleted successfully: %s", chat_id)
         return True
     except ResourceNotFoundError:
         # It's okay if it's already gone
-        logger.warning(f"Chat session not found for deletion (might have been deleted already): {chat_id}")
+        logger.warning("Chat session not found for deletion (might have been deleted already): %s", chat_id)
         return True # Treat as success if not found
     except Exception as e:
-        logger.error(f"Failed to delete chat session {chat_id}: {e}")
-        return False 
\ No newline at end of file
+        logger.error("Failed to delete chat session %s: %s", chat_id, e)
+        return False 
+
+def _batch_item_row(index: int) -> str:
+    return f"item-{index:05d}"
+
+def create_batch(batch_id: str, created_at: float, items: list[dict]) -> bool:
+    """
+    Stores the status rows for a new batch: one row per item, then the batch's summary row.
+    The summary row is written last, so a partially stored batch is never reported.
+    """
+    table_client = get_batch_table_client()
+    if not table_client:
+        logger.error("Batch table client not initialized. Cannot create batch.")
+        return False
+
+    entities = [
+        {
+            "PartitionKey": batch_id,
+            "RowKey": _batch_item_row(item["index"]),
+            "Index": item["index"],
+            "ChatId": item["chat_id"],
+            "Name": item["name"],
+            "Status": item["status"],
+            "Error": "",
+        }
+        for item in items
+    ]
+    entities.append({"PartitionKey": batch_id, "RowKey": BATCH_HEADER_ROW, "CreatedAt": created_at, "Total": len(items)})
+    try:
+        # A transaction is limited to one partition and BATCH_TRANSACTION_SIZE operations
+        for start in range(0, len(entities), BATCH_TRANSACTION_SIZE):
+            table_client.submit_transaction([("upsert", entity) for entity in entities[start:start + BATCH_TRANSACTION_SIZE]])
+        logger.info("Batch created successfully: %s", batch_id)
+        return True
+    except Exception as e:
+        logger.error("Failed to create batch %s: %s", batch_id, e)
+        return False
+
+def update_batch_item(batch_id: str, index: int, status: str, error: str | None = None, finished_at: float | None = None) -> bool:
+    """Updates the status (and failure reason / finish time, if given) of one batch item."""
+    table_client = get_batch_table_client()
+    if not table_client:
+        logger.error("Batch table client not initialized. Cannot update batch item.")
+        return False
+
+    entity = {
+        "PartitionKey": batch_id,
+        "RowKey": _batch_item_row(index),
+        "Status": status,
+        "Error": error or "",
+    }
+    if finished_at is not None:
+        entity["FinishedAt"] = finished_at
+    try:
+        table_client.update_entity(entity=entity, mode=UpdateMode.MERGE)
+        return True
+    except Exception as e:
+        logger.error("Failed to update batch %s item %s: %s", batch_id, index, e)
+        return False
+
+def get_batch(batch_id: str) -> dict | None:
+    """Retrieves a batch's creation time and its items (ordered by index), or None if not found."""
+    table_client = get_batch_table_client()
+    if not table_client:
+        logger.error("Batch table client not initialized. Cannot get batch.")
+        return None
+    try:
+        entities = list(table_client.query_entities(query_filter="PartitionKey eq @batch", parameters={"batch": batch_id}))
+    except Exception as e:
+        logger.error("Failed to retrieve batch %s: %s", batch_id, e)
+        return None
+
+    header = next((entity for entity in entities if entity["RowKey"] == BATCH_HEADER_ROW), None)
+    if header is None:
+        logger.warning("Batch not found: %s", batch_id)
+        return None
+    items = sorted(
+        (
+            {
+                "index": entity["Index"],
+                "chat_id": entity["ChatId"],
+                "name": entity["Name"],
+                "status": entity["Status"],
+                "error": entity.get("Error") or None,
+                "finished_at": entity.get("FinishedAt"),
+            }
+            for entity in entities
+            if entity["RowKey"] != BATCH_HEADER_ROW
+        ),
+        key=lambda item: item["index"],
+    )
+    return {"id": batch_id, "created_at": header["CreatedAt"], "items": items}
@@ -1,6 +1,7 @@
 import requests
 import time
 import sys
+import json
 
 # --- Configuration ---
 BASE_URL = "http://127.0.0.1:8000/api" # Your FastAPI backend URL
@@ -15,6 +16,13 @@ def run_test_sequence():
     try:
         print("--- Starting API Test Sequence ---")
 
+        # 0. Readiness
+        print("\n[0] Testing GET /readyz (Dependency Readiness)")
+        response = requests.get(f"{BASE_URL.rsplit('/api', 1)[0]}/readyz")
+        print(f"    Status Code: {response.status_code}")
+        assert response.status_code == 200, f"Expected 200, got {response.status_code}: {response.text}"
+        print(f"    Dependencies: {response.json().get('dependencies')}")
+
         # 1. Create Chat
         print("\n[1] Testing POST /chats (Create Chat)")
         create_payload = {"name": "API Test Chat"}
@@ -113,6 +121,27 @@ def run_test_sequence():
         print(f"    PRD Markdown retrieved. Length: {len(prd_content.get('markdown', ''))}")
         # print(f"    PRD Content Sample:\n------\n{prd_content.get('markdown', '')[:200]}...\n------")
 
+        # 9. PRD Completeness Status
+        print(f"\n[9] Testing GET /chats/{chat_id}/prd/status (PRD Status)")
+        response = requests.get(f"{BASE_URL}/chats/{chat_id}/prd/status")
+        print(f"    Status Code: {response.status_code}")
+        assert response.status_code == 200, f"Expected 200, got {response.status_code}"
+        prd_status = response.json()
+        assert 0.0 <= prd_status['completeness'] <= 1.0, "Completeness out of range"
+        assert prd_status['sections'], "No sections reported"
+        print(f"    PRD is {prd_status['completeness']:.0%} complete ({prd_status['filled_fields']}/{prd_status['total_fields']} fields).")
+
+        # 10. Bulk Export (NDJSON)
+        print(f"\n[10] Testing GET /exports (NDJSON Export filtered by name)")
+        response = requests.get(f"{BASE_URL}/exports", params={"format": "ndjson", "name": new_name}, stream=True)
+        print(f"    Status Code: {response.status_code}")
+        assert response.status_code == 200, f"Expected 200, got {response.status_code}"
+        exported = [json.loads(line) for line in response.iter_lines() if line]
+        exported_chat = next((record for record in exported if record['id'] == chat_id), None)
+        assert exported_chat, f"Chat {chat_id} missing from export"
+        assert exported_chat['prd_markdown'] == prd_content.get('markdown'), "Exported PRD does not match stored PRD"
+        print(f"    Export streamed {len(exported)} record(s), including chat {chat_id}.")
+
         print("\n--- API Test Sequence Completed Successfully ---")
 
     except AssertionError as e:
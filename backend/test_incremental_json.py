@@ -0,0 +1,108 @@
+import json
+
+import pytest
+
+from incremental_json import IncrementalJsonParser
+
+
+def _feed_all(document: str, chunk_size: int = 1, max_depth: int = 2):
+    """Feeds `document` in fixed-size chunks and returns the parser plus every emitted (path, value) pair."""
+    parser = IncrementalJsonParser(max_depth=max_depth)
+    emitted = []
+    for start in range(0, len(document), chunk_size):
+        emitted.extend(parser.feed(document[start:start + chunk_size]))
+    return parser, emitted
+
+
+def test_byte_by_byte_feed_matches_json_loads():
+    document = json.dumps({
+        "message": "Hello, what does the product do?",
+        "prd_sections": {"product_name": "Acme", "goals": "- Grow\n- Retain"},
+    })
+    for chunk_size in (1, 2, 7, len(document)):
+        parser, emitted = _feed_all(document, chunk_size)
+        assert parser.done
+        assert parser.close() == json.loads(document)
+        assert emitted == [
+            (("message",), "Hello, what does the product do?"),
+            (("prd_sections", "product_name"), "Acme"),
+            (("prd_sections", "goals"), "- Grow\n- Retain"),
+            (("prd_sections",), {"product_name": "Acme", "goals": "- Grow\n- Retain"}),
+        ]
+
+
+def test_member_is_emitted_as_soon_as_it_closes():
+    parser = IncrementalJsonParser()
+    assert parser.feed('{"message": "Hi') == []
+    assert parser.feed('!", "prd_sections": {"a"') == [(("message",), "Hi!")]
+    assert not parser.done
+
+
+def test_escapes_in_keys_and_values():
+    document = r'{"k\"eyé": "quote \" backslash \\ newline \n snow ☃ emoji 😀 slash \/"}'
+    parser, emitted = _feed_all(document)
+    expected = json.loads(document)
+    assert emitted == [(("k\"eyé",), expected["k\"eyé"])]
+    assert parser.close() == expected
+
+
+def test_escaped_backslash_before_closing_quote():
+    parser, emitted = _feed_all(r'{"a": "ends with \\", "b": "x"}')
+    assert emitted == [(("a",), "ends with \\"), (("b",), "x")]
+
+
+def test_nested_objects_and_arrays_respect_max_depth():
+    document = json.dumps({"a": {"b": {"c": 1}, "d": [1, [2, 3], {"e": None}]}, "f": []})
+    parser, emitted = _feed_all(document, max_depth=2)
+    assert emitted == [
+        (("a", "b"), {"c": 1}),
+        (("a", "d"), [1, [2, 3], {"e": None}]),
+        (("a",), {"b": {"c": 1}, "d": [1, [2, 3], {"e": None}]}),
+        (("f",), []),
+    ]
+    assert parser.close() == json.loads(document)
+
+    _, deep = _feed_all(document, max_depth=3)
+    assert (("a", "d", 1), [2, 3]) in deep
+    assert (("a", "d", 0), 1) in deep
+
+
+@pytest.mark.parametrize("document, expected", [
+    ('{"a":true}', [(("a",), True)]),
+    ('{"a":false,"b":null}', [(("a",), False), (("b",), None)]),
+    ('{"a":-1.5e3}', [(("a",), -1500.0)]),
+    ('{"a":[1,null]}', [(("a", 0), 1), (("a", 1), None), (("a",), [1, None])]),
+    ('{ "a" : 12 \n}', [(("a",), 12)]),
+])
+def test_literals_right_before_closing_brackets(document, expected):
+    parser, emitted = _feed_all(document)
+    assert parser.done
+    assert emitted == expected
+
+
+def test_invalid_literal_raises():
+    with pytest.raises(ValueError):
+        _feed_all('{"a":tru}')
+
+
+def test_trailing_whitespace_is_allowed_but_trailing_data_raises():
+    parser, _ = _feed_all('{"a": 1}  \n')
+    assert parser.done
+    with pytest.raises(ValueError):
+        parser.feed("x")
+    with pytest.raises(ValueError):
+        parser.feed("{}")
+
+
+@pytest.mark.parametrize("document", ['{"a": 1', '{"a": "unterminated', '{"a": tru', '{"a": [1, 2', '{"a"', ''])
+def test_truncated_document_fails_on_close(document):
+    parser, _ = _feed_all(document)
+    assert not parser.done
+    with pytest.raises(ValueError):
+        parser.close()
+
+
+@pytest.mark.parametrize("document", ['[1, 2]', '{"a" 1}', '{"a": 1 "b": 2}', '{"a": }', '{,}', '{"a": [1,, 2]}'])
+def test_malformed_document_raises(document):
+    with pytest.raises(ValueError):
+        _feed_all(document)
@@ -1,6 +1,6 @@
 'use client'; // Mark this component as a Client Component
 
-import React, { useState, useEffect, useCallback } from 'react';
+import React, { useState, useEffect, useCallback, useRef } from 'react';
 import { ChatInfo, ChatMessage } from '@/types/chat';
 import { apiClient } from '@/lib/apiClient';
 import ChatList from '@/components/ChatList';
@@ -8,6 +8,10 @@ import ChatView from '@/components/ChatView';
 import PrdView from '@/components/PrdView';
 import { Toaster, toast } from 'sonner'; // For displaying notifications
 
+// While the backend reports a PRD update as pending, refetch it at this interval (bounded, in case it never lands)
+const PRD_POLL_INTERVAL_MS = 1500;
+const PRD_POLL_MAX_ATTEMPTS = 40;
+
 export default function Home() {
     const [chats, setChats] = useState<ChatInfo[]>([]);
     const [selectedChatId, setSelectedChatId] = useState<string | null>(null);
@@ -17,6 +21,29 @@ export default function Home() {
     const [isLoadingChatDetails, setIsLoadingChatDetails] = useState<boolean>(false);
     const [isSendingMessage, setIsSendingMessage] = useState<boolean>(false);
     const [isCreatingChat, setIsCreatingChat] = useState<boolean>(false);
+    // Lets PRD polling notice that the user switched chats while it was waiting
+    const selectedChatIdRef = useRef<string | null>(null);
+
+    useEffect(() => {
+        selectedChatIdRef.current = selectedChatId;
+    }, [selectedChatId]);
+
+    // Keeps refetching the PRD while the backend is still writing it, updating the preview each time
+    const pollPendingPrd = useCallback(async (chatId: string) => {
+        for (let attempt = 0; attempt < PRD_POLL_MAX_ATTEMPTS; attempt++) {
+            await new Promise(resolve => setTimeout(resolve, PRD_POLL_INTERVAL_MS));
+            if (selectedChatIdRef.current !== chatId) return;
+            try {
+                const prdData = await apiClient.getPrdMarkdown(chatId);
+                if (selectedChatIdRef.current !== chatId) return;
+                setCurrentPrdMarkdown(prdData.markdown || '');
+                if (!prdData.pending) return;
+            } catch (error: unknown) {
+                console.error('Failed to poll PRD markdown:', error);
+                return;
+            }
+        }
+    }, []);
 
     // --- Data Fetching Callbacks ---
 
@@ -55,6 +82,9 @@ export default function Home() {
             // Fetch the latest PRD markdown (content of the last assistant message)
             const prdData = await apiClient.getPrdMarkdown(chatId);
             setCurrentPrdMarkdown(prdData.markdown || ''); // Use fetched markdown directly
+            if (prdData.pending) {
+                void pollPendingPrd(chatId);
+            }
 
         } catch (error: unknown) {
             console.error(`Failed to fetch details for chat ${chatId}:`, error);
@@ -65,7 +95,7 @@ export default function Home() {
         } finally {
             setIsLoadingChatDetails(false);
         }
-    }, []);
+    }, [pollPendingPrd]);
 
     // --- Initial Data Load ---
     useEffect(() => {
@@ -177,6 +207,10 @@ export default function Home() {
             try {
                  const prdData = await apiClient.getPrdMarkdown(currentChatId);
                  setCurrentPrdMarkdown(prdData.markdown || ''); // Update PRD preview
+                 // The backend may still be writing this message's PRD update; keep refreshing until it lands
+                 if (prdData.pending) {
+                     void pollPendingPrd(currentChatId);
+                 }
             } catch (prdError: unknown) {
                  console.error('Failed to fetch updated PRD markdown:', prdError);
                  // Type guard
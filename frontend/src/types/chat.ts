@@ -22,4 +22,5 @@ export interface AssistantResponse {
 
 export interface PrdContent {
     markdown: string;
+    pending?: boolean; // True while a background PRD update from a recent message is still being written
 } 
\ No newline at end of file